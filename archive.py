@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+
+from lookups import STATUS_IDS
+
+logger = logging.getLogger(__name__)
+
+# БД такого размера (страниц по 4 КБ) VACUUM переписывает за доли секунды
+SMALL_DATABASE_PAGES = 1000
+
+ARCHIVE_COLUMNS = (
+    "id, user_id, username, full_name, department_id, request_type_id, problem, photo_id, "
+    "status_id, created_at, admin_message_id, first_response_at, resolved_at, "
+    "admin_message_is_caption, user_message_id, digest_id, admin_chat_id, problem_hash"
+)
+
+
+class Archiver:
+    """Периодический перенос решенных заявок старше max_age_days в requests_archive.
+
+    Заявки переносятся порциями по batch_size, каждая порция — отдельная
+    короткая транзакция, между порциями освобождается до vacuum_pages
+    страниц (incremental VACUUM), чтобы файл БД не рос.
+    """
+
+    def __init__(self, pool, max_age_days=180, interval=3600, batch_size=500, vacuum_pages=2000,
+                 full_vacuum=False):
+        self.pool = pool
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.full_vacuum = full_vacuum
+        self._task = None
+        self._stop = asyncio.Event()
+
+    def start(self):
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    async def enable_incremental_vacuum(self):
+        """auto_vacuum=INCREMENTAL применяется к существующему файлу только после полного VACUUM.
+
+        Полный VACUUM держит блокировку писателя все время работы, поэтому
+        на БД больше SMALL_DATABASE_PAGES страниц выполняется, только если
+        он явно разрешен (full_vacuum). Новая маленькая БД переводится сразу.
+        """
+        async with self.pool.writer() as db:
+            cursor = await db.execute("PRAGMA auto_vacuum")
+            (mode,) = await cursor.fetchone()
+            if mode == 2:
+                return
+            cursor = await db.execute("PRAGMA page_count")
+            (pages,) = await cursor.fetchone()
+            if not self.full_vacuum and pages > SMALL_DATABASE_PAGES:
+                logger.warning(
+                    "incremental auto_vacuum выключен: место после переноса в архив не освобождается. "
+                    "Для однократного полного VACUUM запустите бота с ARCHIVE_FULL_VACUUM=1"
+                )
+                return
+            logger.warning("Включаем incremental auto_vacuum: выполняется полный VACUUM, запись в БД приостановлена")
+            started = time.monotonic()
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+            # VACUUM в WAL-режиме переписывает весь файл через журнал — сразу его обрезаем
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.warning(f"Полный VACUUM выполнен за {time.monotonic() - started:.1f} с")
+
+    async def _run(self):
+        try:
+            await self.enable_incremental_vacuum()
+        except Exception as e:
+            logger.error(f"Не удалось включить incremental auto_vacuum: {e}")
+
+        while not self._stop.is_set():
+            try:
+                moved = await self.run_once()
+                if moved:
+                    logger.info(f"В архив перенесено заявок: {moved}")
+            except Exception as e:
+                logger.error(f"Ошибка при переносе заявок в архив: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self):
+        cutoff = int(time.time()) - self.max_age_days * 86400
+        moved = 0
+        while not self._stop.is_set():
+            count = await self._move_batch(cutoff)
+            moved += count
+            if count:
+                async with self.pool.writer() as db:
+                    await db.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+            if count < self.batch_size:
+                break
+            # Между порциями даем обработчикам взять блокировку писателя
+            await asyncio.sleep(0.05)
+        return moved
+
+    async def _move_batch(self, cutoff):
+        archived_at = int(time.time())
+        async with self.pool.transaction() as db:
+            # Возраст считается от решения заявки; у заявок, решенных до появления
+            # resolved_at, — от создания
+            cursor = await db.execute(
+                """SELECT id FROM requests
+                WHERE status_id = ?
+                AND (resolved_at < ? OR (resolved_at IS NULL AND created_at < ?))
+                ORDER BY id
+                LIMIT ?""",
+                (STATUS_IDS["done"], cutoff, cutoff, self.batch_size)
+            )
+            ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                return 0
+            placeholders = ", ".join("?" * len(ids))
+            await db.execute(
+                f"""INSERT INTO requests_archive ({ARCHIVE_COLUMNS}, archived_at)
+                SELECT {ARCHIVE_COLUMNS}, ? FROM requests WHERE id IN ({placeholders})""",
+                (archived_at, *ids)
+            )
+            await db.execute(f"DELETE FROM requests WHERE id IN ({placeholders})", ids)
+        return len(ids)
@@ -0,0 +1,119 @@
+"""Сравнение обычного и потокового (большого) режима формирования PDF-отчетов.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_reports --sizes 10000 100000
+
+Для каждого размера создается временная БД с синтетическими заявками,
+каждый замер выполняется в отдельном процессе, чтобы пиковый RSS
+не накапливался между запусками.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from migrations import MIGRATIONS
+
+REQUEST_TYPE = "🚨 Проблема (что-то сломалось)"
+QUERY = """SELECT id, created_at, full_name, problem, status_id
+    FROM requests
+    WHERE request_type_id = ?
+    AND created_at >= ? AND created_at < ?
+    ORDER BY created_at"""
+# В пустой БД справочник типов заполняется с 1
+PARAMS = (1, 0, int(datetime(2100, 1, 1).timestamp()))
+
+WORDS = ("не", "работает", "принтер", "сеть", "1С", "почта", "монитор", "включается",
+         "ошибка", "при", "входе", "в", "систему", "нужен", "картридж", "ноутбук")
+
+
+def create_database(path, rows):
+    connection = sqlite3.connect(path)
+    for _, statements in MIGRATIONS:
+        for statement in statements:
+            connection.execute(statement)
+    connection.execute("INSERT INTO departments (name) VALUES ('Бухгалтерия')")
+    connection.execute("INSERT INTO request_types (name) VALUES (?)", (REQUEST_TYPE,))
+    start = datetime(2020, 1, 1)
+    random.seed(rows)
+    connection.executemany(
+        """INSERT INTO requests
+        (user_id, username, full_name, department_id, request_type_id, problem, status_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            (
+                random.randint(1, 5000),
+                "user",
+                "Иванов Иван Иванович",
+                1,
+                PARAMS[0],
+                " ".join(random.choices(WORDS, k=random.randint(3, 60))),
+                random.choice((1, 2, 3)),
+                int((start + timedelta(minutes=i)).timestamp()),
+            )
+            for i in range(rows)
+        )
+    )
+    connection.commit()
+    connection.close()
+
+
+def run_worker(mode, database):
+    from report_pdf import create_large_pdf, create_pdf
+
+    started = time.perf_counter()
+    if mode == "classic":
+        connection = sqlite3.connect(database)
+        rows = connection.execute(QUERY, PARAMS).fetchall()
+        connection.close()
+        pdf = create_pdf(rows, "Benchmark")
+        size = len(pdf)
+    else:
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        create_large_pdf(database, QUERY, PARAMS, "Benchmark", path)
+        size = os.path.getsize(path)
+        os.remove(path)
+    elapsed = time.perf_counter() - started
+
+    # ru_maxrss в Linux измеряется в килобайтах
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_rss, "pdf_mb": size / 1024 / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--modes", nargs="+", default=["classic", "large"], choices=["classic", "large"])
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "DATABASE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    print(f"{'rows':>8} {'mode':>8} {'time, s':>9} {'peak RSS, MB':>13} {'PDF, MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            database = os.path.join(tmp, f"bench_{rows}.db")
+            create_database(database, rows)
+            for mode in args.modes:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_reports", "--worker", mode, database],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{rows:>8} {mode:>8} {result['seconds']:>9.2f} "
+                      f"{result['peak_rss_mb']:>13.1f} {result['pdf_mb']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Общие части стендов: загрузка main.py с тестовой конфигурацией,
+синтетические обновления Telegram и подсчет перцентилей."""
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+WORDS = ("не", "работает", "принтер", "сеть", "1С", "почта", "монитор", "включается",
+         "ошибка", "при", "входе", "в", "систему", "нужен", "картридж", "ноутбук")
+
+ADMIN_ID = 1
+ADMIN_CHAT_ID = -100
+
+
+def load_bot(database, **env):
+    """Импортирует main.py с тестовым токеном и указанной БД и вызывает setup().
+
+    Конфигурация читается при импорте, поэтому вызывать до любого import main.
+    Сводки заявок отключены (DIGEST_RATE=0): стенды не запускают их задачу,
+    и каждое сообщение администраторам проходит через outbox по отдельности.
+    """
+    os.environ.update({
+        "BOT_TOKEN": "42:TEST",
+        "ADMIN_CHAT_ID": str(ADMIN_CHAT_ID),
+        "ADMIN_ID": str(ADMIN_ID),
+        "DATABASE_NAME": database,
+        "DIGEST_RATE": "0",
+        **env,
+    })
+    import main
+    main.setup()
+    return main
+
+
+def use_fake_session(bot_main, session):
+    """Подменяет сессию бота, сохраняя middleware метрик Bot API."""
+    from metrics import TelegramMetricsMiddleware
+
+    session.middleware(TelegramMetricsMiddleware(bot_main.metrics))
+    bot_main.bot.session = session
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+    def pick(q):
+        return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+
+def format_latency(name, values, elapsed=None):
+    p = percentiles(values)
+    line = (
+        f"{name}: {len(values)} шт., "
+        f"p50 {p['p50'] * 1000:.1f} мс, p95 {p['p95'] * 1000:.1f} мс, "
+        f"p99 {p['p99'] * 1000:.1f} мс, max {p['max'] * 1000:.1f} мс"
+    )
+    if elapsed:
+        line += f", {len(values) / elapsed:.1f} обновлений/с"
+    return line
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"}
+
+
+def message_update(update_id, user_id, text=None, photo=None):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+    }
+    if text is not None:
+        message["text"] = text
+    if photo is not None:
+        message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 1, "height": 1}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id, user_id, data, chat_id=None, message_id=1):
+    chat_id = chat_id if chat_id is not None else user_id
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "text": "bench",
+            },
+        },
+    }
+
+
+def seed_requests(database, rows, users, request_types, departments, days=730, chunk=50_000):
+    """Заполняет таблицу requests синтетическими заявками за последние days дней.
+
+    Схема и справочники должны быть уже созданы (init_db). Возвращает
+    (первая дата, последняя дата).
+    """
+    random.seed(rows)
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start) / max(rows, 1)
+    connection = sqlite3.connect(database)
+    try:
+        department_ids = dict(connection.execute("SELECT name, id FROM departments"))
+        request_type_ids = dict(connection.execute("SELECT name, id FROM request_types"))
+        status_ids = [status_id for (status_id,) in connection.execute("SELECT id FROM statuses")]
+        for offset in range(0, rows, chunk):
+            connection.executemany(
+                """INSERT INTO requests
+                (user_id, username, full_name, department_id, request_type_id, problem,
+                status_id, created_at, admin_message_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    (
+                        10_000 + random.randrange(users),
+                        "user",
+                        "Иванов Иван Иванович",
+                        department_ids[random.choice(departments)],
+                        request_type_ids[random.choice(request_types)],
+                        " ".join(random.choices(WORDS, k=random.randint(3, 40))),
+                        random.choice(status_ids),
+                        int((start + step * i).timestamp()),
+                        100_000 + i,
+                    )
+                    for i in range(offset, min(rows, offset + chunk))
+                )
+            )
+            connection.commit()
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    return start, end
@@ -0,0 +1,97 @@
+"""Подставная сессия Bot API: отвечает на вызовы бота без обращения к Telegram.
+
+    bot = Bot(token="42:TEST", session=FakeTelegramSession())
+
+Все вызовы сохраняются в session.calls. Ответы собираются из аргументов
+метода и проходят тот же разбор, что и настоящие ответы Telegram, поэтому
+обработчики получают обычные объекты Message/User/… Можно подмешивать
+RetryAfter (retry_after_every) и сетевые ошибки (fail_every), а также
+задержку ответа: latency секунд плюс случайная добавка до jitter.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+import typing
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import GetMe, GetUpdates, SendDocument, SendMediaGroup, SendPhoto
+from aiogram.types import Message
+
+
+class FakeTelegramSession(BaseSession):
+    def __init__(self, retry_after_every=0, retry_after=1, fail_every=0, latency=0.0, jitter=0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_every = retry_after_every
+        self.retry_after = retry_after
+        self.fail_every = fail_every
+        self.calls = []
+        self._counter = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    def calls_of(self, method_type):
+        return [call for call in self.calls if isinstance(call, method_type)]
+
+    async def make_request(self, bot, method, timeout=None):
+        number = next(self._counter)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.fail_every and number % self.fail_every == 0:
+            raise TelegramNetworkError(method=method, message="fake network error")
+
+        if self.retry_after_every and number % self.retry_after_every == 0:
+            content = {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        else:
+            self.calls.append(method)
+            content = {"ok": True, "result": self._result(bot, method)}
+
+        response = self.check_response(bot=bot, method=method, status_code=200, content=json.dumps(content))
+        return response.result
+
+    def _message(self, method, chat_id=None):
+        chat_id = chat_id if chat_id is not None else getattr(method, "chat_id", None) or 1
+        message = {
+            "message_id": getattr(method, "message_id", None) or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if int(chat_id) > 0 else "supergroup"},
+        }
+        if getattr(method, "text", None):
+            message["text"] = method.text
+        if getattr(method, "caption", None):
+            message["caption"] = method.caption
+        if isinstance(method, SendPhoto):
+            file_id = method.photo if isinstance(method.photo, str) else f"photo-{message['message_id']}"
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+        if isinstance(method, SendDocument):
+            file_id = method.document if isinstance(method.document, str) else f"document-{message['message_id']}"
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        return message
+
+    def _result(self, bot, method):
+        if isinstance(method, GetMe):
+            return {"id": bot.id, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if isinstance(method, GetUpdates):
+            return []
+        if isinstance(method, SendMediaGroup):
+            return [self._message(method) for _ in method.media]
+
+        returning = method.__returning__
+        candidates = typing.get_args(returning) or (returning,)
+        if Message in candidates:
+            return self._message(method)
+        return True
@@ -0,0 +1,116 @@
+"""Нагрузка на диалог создания заявки без сети: обновления подаются
+прямо в диспетчер, Bot API заменен FakeTelegramSession.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.flow_load --users 500 --latency 0.05 --jitter 0.05
+
+Каждый пользователь проходит /create_request → тип → отдел → ФИО →
+описание → фото или «Пропустить»; пользователи работают одновременно.
+Задержка шага — время обработки обновления вместе с ответами бота.
+После прогона ждем, пока outbox разошлет сообщения администраторам;
+с настоящими лимитами Telegram (20 сообщений в минуту в группу) это долго,
+поэтому --no-rate-limits снимает лимиты outbox для замера его пропускной способности.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+from benchmarks.common import format_latency, load_bot, message_update, use_fake_session
+
+
+async def wait_outbox(bot_main, timeout):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        async with bot_main.pool.acquire() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM outbox")
+            (left,) = await cursor.fetchone()
+        if not left:
+            return time.perf_counter() - started
+        bot_main.outbox.wake()
+        await asyncio.sleep(0.05)
+    return None
+
+
+async def run(bot_main, args):
+    from benchmarks.fake_telegram import FakeTelegramSession
+
+    session = FakeTelegramSession(
+        latency=args.latency,
+        jitter=args.jitter,
+        retry_after_every=args.retry_after_every,
+        retry_after=1
+    )
+    use_fake_session(bot_main, session)
+    if args.no_rate_limits:
+        from ratelimit import TokenBucket
+
+        bot_main.outbox.private_chat_rate = bot_main.outbox.group_chat_rate = 10_000
+        bot_main.outbox._global_bucket = TokenBucket(10_000, 10_000)
+    await bot_main.pool.open()
+    await bot_main.init_db()
+    bot_main.storage.start()
+    bot_main.outbox.start()
+
+    update_ids = itertools.count(1)
+    latencies = []
+
+    async def feed(update):
+        started = time.perf_counter()
+        await bot_main.dp.feed_raw_update(bot_main.bot, update)
+        latencies.append(time.perf_counter() - started)
+
+    async def simulate_user(n):
+        user_id = 10_000 + n
+        for text in (
+            "/create_request",
+            bot_main.request_types[n % len(bot_main.request_types)],
+            bot_main.departments[n % len(bot_main.departments)],
+            "Иванов Иван Иванович",
+            f"Не работает принтер в кабинете {n}",
+        ):
+            await feed(message_update(next(update_ids), user_id, text))
+        if n % args.photo_every == 0:
+            await feed(message_update(next(update_ids), user_id, photo=f"photo-{n}"))
+        else:
+            await feed(message_update(next(update_ids), user_id, "⏭ Пропустить"))
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(n) for n in range(args.users)))
+        elapsed = time.perf_counter() - started
+        drained = await wait_outbox(bot_main, args.outbox_timeout)
+    finally:
+        await bot_main.outbox.stop()
+        await bot_main.storage.close()
+        await bot_main.pool.close()
+
+    print(f"пользователей: {args.users}, время: {elapsed:.2f} с")
+    print(format_latency("шаги диалога", latencies, elapsed))
+    if drained is None:
+        print(f"outbox не разослан за {args.outbox_timeout} с")
+    else:
+        print(f"outbox разослан через {drained:.2f} с после последнего шага")
+    print(f"вызовов Bot API: {len(session.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--retry-after-every", type=int, default=0, help="каждый N-й вызов получает RetryAfter")
+    parser.add_argument("--photo-every", type=int, default=3, help="каждый N-й пользователь прикладывает фото")
+    parser.add_argument("--outbox-timeout", type=float, default=120)
+    parser.add_argument("--no-rate-limits", action="store_true", help="снять лимиты отправки outbox")
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), "flow_load.db")
+    asyncio.run(run(load_bot(database), args))
+
+
+if __name__ == "__main__":
+    main()
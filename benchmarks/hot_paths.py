@@ -0,0 +1,145 @@
+"""Замер горячих путей main.py на заполненной БД: /my_requests с
+листанием страниц, смена статуса заявки администратором и /generate_reports.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.hot_paths --sizes 10000 100000 1000000
+
+Для каждого размера создается временная БД с синтетическими заявками
+за два года, обработчики вызываются через диспетчер с FakeTelegramSession.
+Отчеты строятся за последнюю неделю и последний месяц, кеш отчетов перед
+каждым замером сбрасывается, чтобы мерить именно формирование PDF.
+Каждый размер замеряется в отдельном процессе.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.common import (
+    ADMIN_CHAT_ID,
+    ADMIN_ID,
+    callback_update,
+    format_latency,
+    load_bot,
+    message_update,
+    seed_requests,
+    use_fake_session,
+)
+
+USERS = 5000
+
+
+async def bench(bot_main, rows, args):
+    from benchmarks.fake_telegram import FakeTelegramSession
+    from report_cache import ReportCache
+
+    session = FakeTelegramSession(latency=args.latency)
+    use_fake_session(bot_main, session)
+    await bot_main.pool.open()
+    await bot_main.init_db()
+    bot_main.storage.start()
+    bot_main.report_renderer.start()
+
+    started = time.perf_counter()
+    _, end = seed_requests(
+        bot_main.DATABASE_NAME, rows, USERS, bot_main.request_types, bot_main.departments
+    )
+    print(f"[{rows}] БД заполнена за {time.perf_counter() - started:.1f} с", flush=True)
+
+    update_ids = itertools.count(1)
+    random.seed(0)
+    results = {}
+
+    async def timed(name, update):
+        started = time.perf_counter()
+        await bot_main.dp.feed_raw_update(bot_main.bot, update)
+        results.setdefault(name, []).append(time.perf_counter() - started)
+
+    try:
+        # /my_requests: первая страница и переход на следующую по кнопке ▶
+        for _ in range(args.repeat):
+            user_id = 10_000 + random.randrange(USERS)
+            await timed("/my_requests", message_update(next(update_ids), user_id, "/my_requests"))
+            markup = session.calls[-1].reply_markup
+            # Повторный просмотр без изменений отдается из request_cache
+            await timed("/my_requests повтор", message_update(next(update_ids), user_id, "/my_requests"))
+            buttons = [button for row in markup.inline_keyboard for button in row] if markup else []
+            older = [button for button in buttons if button.text == "▶"]
+            if older:
+                await timed("/my_requests ▶", callback_update(next(update_ids), user_id, older[0].callback_data))
+
+        # Смена статуса из чата администраторов
+        for _ in range(args.repeat):
+            request_id = random.randint(1, rows)
+            action = random.choice(("working", "done"))
+            await timed(
+                "update_status",
+                callback_update(next(update_ids), ADMIN_ID, f"status_{action}_{request_id}", chat_id=ADMIN_CHAT_ID)
+            )
+            await timed(
+                "update_status повтор",
+                callback_update(next(update_ids), ADMIN_ID, f"status_{action}_{request_id}", chat_id=ADMIN_CHAT_ID)
+            )
+
+        # Отчеты: кеш сбрасывается, чтобы каждый раз формировался PDF
+        for days in (7, 30):
+            command = (
+                f"/generate_reports {(end - timedelta(days=days)).strftime('%Y-%m-%d')} "
+                f"{end.strftime('%Y-%m-%d')}"
+            )
+            for _ in range(args.report_repeat):
+                bot_main.report_cache = ReportCache(max_entries=bot_main.REPORT_CACHE_SIZE)
+                await timed(f"/generate_reports {days} дн.", message_update(next(update_ids), ADMIN_ID, command))
+    finally:
+        bot_main.report_renderer.shutdown()
+        await bot_main.storage.close()
+        await bot_main.pool.close()
+
+    return results
+
+
+def run_size(rows, args):
+    database = os.path.join(tempfile.mkdtemp(), f"hot_paths_{rows}.db")
+    bot_main = load_bot(database)
+    results = asyncio.run(bench(bot_main, rows, args))
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=200, help="повторов /my_requests и смены статуса")
+    parser.add_argument("--report-repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        run_size(args.run_size, args)
+        return
+
+    for rows in args.sizes:
+        command = [
+            sys.executable, "-m", "benchmarks.hot_paths", "--run-size", str(rows),
+            "--repeat", str(args.repeat), "--report-repeat", str(args.report_repeat),
+            "--latency", str(args.latency),
+        ]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        lines = output.strip().splitlines()
+        results = json.loads(lines[-1])
+        print("\n".join(lines[:-1]))
+        print(f"== {rows} строк ==")
+        for name, values in results.items():
+            print(format_latency(name, values))
+
+
+if __name__ == "__main__":
+    main()
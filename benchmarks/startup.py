@@ -0,0 +1,100 @@
+"""Замер запуска бота: импорт main.py вместе с setup(), время от старта
+процесса до первого getUpdates и RSS процесса в этот момент.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --eager-reports   # как было: reportlab и openpyxl при импорте
+
+Каждый запуск — отдельный процесс с новой БД, Telegram заменен
+FakeTelegramSession. После первого getUpdates polling останавливается.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ("reportlab", "openpyxl")
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_once(process_started, eager_reports):
+    import asyncio
+
+    if eager_reports:
+        import openpyxl  # noqa: F401
+        import report_pdf  # noqa: F401
+
+    from benchmarks.common import load_bot
+
+    started = time.perf_counter()
+    bot_main = load_bot(os.path.join(tempfile.mkdtemp(), "startup.db"), REPORT_WARMUP="0")
+    import_seconds = time.perf_counter() - started
+
+    from aiogram.methods import GetUpdates
+    from benchmarks.fake_telegram import FakeTelegramSession
+
+    result = {}
+
+    class FirstPollSession(FakeTelegramSession):
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, GetUpdates) and not result:
+                result["first_get_updates"] = time.time() - process_started
+                result["rss_mb"] = rss_mb()
+                asyncio.get_running_loop().create_task(bot_main.dp.stop_polling())
+            # Без задержки ответа polling не отдает управление event loop
+            await asyncio.sleep(0)
+            return await super().make_request(bot, method, timeout)
+
+    bot_main.bot.session = FirstPollSession()
+    asyncio.run(bot_main.main())
+
+    result["import_main"] = import_seconds
+    result["loaded"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--eager-reports", action="store_true", help="импортировать reportlab и openpyxl заранее")
+    parser.add_argument("--run-once", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_once:
+        print(json.dumps(run_once(args.run_once, args.eager_reports)))
+        return
+
+    results = []
+    for _ in range(args.repeat):
+        command = [sys.executable, "-m", "benchmarks.startup", "--run-once", repr(time.time())]
+        if args.eager_reports:
+            command.append("--eager-reports")
+        output = subprocess.run(
+            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    def median(key):
+        values = sorted(result[key] for result in results)
+        return values[len(values) // 2]
+
+    print(f"Запусков: {len(results)}")
+    print(f"Импорт main.py и setup(): {median('import_main') * 1000:.0f} мс (медиана)")
+    print(f"До первого getUpdates: {median('first_get_updates') * 1000:.0f} мс (медиана)")
+    print(f"RSS при первом getUpdates: {median('rss_mb'):.1f} МБ (медиана)")
+    print(f"Загружены: {', '.join(results[-1]['loaded']) or 'ни reportlab, ни openpyxl'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Локальный стенд для webhook-режима: шлет синтетические обновления POST-запросами.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.webhook_load --users 200 --concurrency 32
+
+Поднимает aiohttp-приложение из webhook.build_app с настоящими обработчиками
+main.py, временной БД и FakeTelegramSession вместо Bot API. Каждый
+пользователь проходит /create_request целиком, дожидаясь ответа бота
+на каждый шаг. В конце выводится пропускная способность и задержки.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.common import format_latency, load_bot, use_fake_session
+
+SECRET = "load-test-secret"
+PATH = "/webhook"
+
+
+def build_session_class():
+    from benchmarks.fake_telegram import FakeTelegramSession
+
+    class ReplyTrackingSession(FakeTelegramSession):
+        """Сообщает о каждом ответе бота в личный чат пользователя."""
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.replies = defaultdict(asyncio.Event)
+
+        async def make_request(self, bot, method, timeout=None):
+            result = await super().make_request(bot, method, timeout)
+            chat_id = getattr(method, "chat_id", None)
+            if chat_id is not None:
+                self.replies[chat_id].set()
+            return result
+
+    return ReplyTrackingSession
+
+
+def make_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def run(bot_main, users, concurrency):
+    from aiohttp import ClientSession
+    from aiohttp.test_utils import TestServer
+    from webhook import build_app
+
+    session = build_session_class()()
+    use_fake_session(bot_main, session)
+    await bot_main.pool.open()
+    await bot_main.init_db()
+    bot_main.storage.start()
+    bot_main.outbox.start()
+
+    app = build_app(bot_main.dp, bot_main.bot, PATH, secret_token=SECRET, concurrency=concurrency)
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url(PATH))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    def steps(user_id):
+        # Описание у каждого свое, иначе заявки считались бы повторными обращениями
+        return [
+            "/create_request",
+            bot_main.request_types[0],
+            bot_main.departments[0],
+            "Иванов Иван Иванович",
+            f"Не работает принтер в кабинете {user_id}",
+            "⏭ Пропустить",
+        ]
+    update_ids = iter(range(1, 10 ** 9))
+    latencies = []
+
+    async def simulate_user(http, user_id):
+        for text in steps(user_id):
+            reply = session.replies[user_id]
+            reply.clear()
+            started = time.perf_counter()
+            async with http.post(url, json=make_update(next(update_ids), user_id, text), headers=headers) as response:
+                response.raise_for_status()
+            await asyncio.wait_for(reply.wait(), timeout=30)
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        async with ClientSession() as http:
+            async with http.post(url, json=make_update(0, 1, "/start"), headers={}) as response:
+                assert response.status == 401, "запрос без секрета должен отклоняться"
+            async with http.get(str(server.make_url("/healthz"))) as response:
+                print("healthz:", await response.json())
+
+            started = time.perf_counter()
+            await asyncio.gather(*(simulate_user(http, 10_000 + n) for n in range(users)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await server.close()
+        await bot_main.outbox.stop()
+        await bot_main.storage.close()
+        await bot_main.pool.close()
+
+    print(f"время: {elapsed:.2f} с")
+    print(format_latency("обновления", latencies, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    bot_main = load_bot(os.path.join(tempfile.mkdtemp(), "webhook_load.db"), RUN_MODE="webhook")
+
+    asyncio.run(run(bot_main, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
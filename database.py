@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Настройки соединения: WAL позволяет читать параллельно с записью,
+# busy_timeout страхует от "database is locked" при внешних писателях
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class _TimedCursor:
+    """Курсор, время выборки строк которого добавляется к времени запроса."""
+
+    __slots__ = ("_cursor", "_sql", "_observe")
+
+    def __init__(self, cursor, sql, observe):
+        self._cursor = cursor
+        self._sql = sql
+        self._observe = observe
+
+    async def _timed(self, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self._observe(self._sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone())
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall())
+
+    def fetchmany(self, size=None):
+        return self._timed(self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TimedConnection:
+    """Обертка соединения aiosqlite, замеряющая время каждого запроса."""
+
+    __slots__ = ("_db", "_observe")
+
+    def __init__(self, db, observe):
+        self._db = db
+        self._observe = observe
+
+    async def execute(self, sql, parameters=None):
+        started = time.perf_counter()
+        try:
+            cursor = await self._db.execute(sql, parameters)
+        finally:
+            self._observe(sql, time.perf_counter() - started)
+        return _TimedCursor(cursor, sql, self._observe)
+
+    async def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return await self._db.executemany(sql, parameters)
+        finally:
+            self._observe(sql, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений с SQLite.
+
+    Читатели берут соединение из очереди, все записи идут через одно
+    соединение-писатель под блокировкой, поэтому писатели не конкурируют
+    между собой за блокировку файла.
+
+    Если передан observe_query(sql, seconds), выданные соединения замеряют
+    время каждого запроса вместе с выборкой строк.
+    """
+
+    def __init__(self, database, size=4, observe_query=None):
+        self.database = database
+        self.size = size
+        self.observe_query = observe_query
+        self._readers = asyncio.Queue()
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._connections = []
+
+    async def _connect(self):
+        # isolation_level=None: транзакции открываются только явно,
+        # читатели не держат открытую транзакцию между запросами
+        db = await aiosqlite.connect(self.database, isolation_level=None)
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        self._connections.append(db)
+        if self.observe_query is not None:
+            return _TimedConnection(db, self.observe_query)
+        return db
+
+    async def open(self):
+        self._writer = await self._connect()
+        for _ in range(self.size):
+            self._readers.put_nowait(await self._connect())
+        logger.info(f"Пул соединений с БД открыт ({self.size} читателей + 1 писатель)")
+
+    async def close(self):
+        for db in self._connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии соединения с БД: {e}")
+        self._connections.clear()
+        self._readers = asyncio.Queue()
+        self._writer = None
+        logger.info("Пул соединений с БД закрыт")
+
+    async def migrate(self, migrations):
+        """Применяет миграции с версией выше текущей PRAGMA user_version.
+
+        Версия перечитывается внутри транзакции каждой миграции (после
+        BEGIN IMMEDIATE), поэтому если несколько процессов запускаются
+        одновременно, миграцию применяет только первый из них.
+        """
+        async with self.acquire() as db:
+            cursor = await db.execute("PRAGMA user_version")
+            (current,) = await cursor.fetchone()
+
+        for version, statements in migrations:
+            if version <= current:
+                continue
+            async with self.transaction() as db:
+                cursor = await db.execute("PRAGMA user_version")
+                (current,) = await cursor.fetchone()
+                if version <= current:
+                    # Уже применена другим процессом
+                    continue
+                for statement in statements:
+                    await db.execute(statement)
+                await db.execute(f"PRAGMA user_version = {int(version)}")
+            logger.info(f"Применена миграция схемы БД до версии {version}")
+            current = version
+        return current
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Соединение только для чтения."""
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Соединение-писатель без транзакции — для VACUUM и подобных команд."""
+        async with self._write_lock:
+            yield self._writer
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Соединение-писатель внутри транзакции: COMMIT при выходе, ROLLBACK при ошибке."""
+        async with self._write_lock:
+            db = self._writer
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                await db.execute("ROLLBACK")
+                raise
+            else:
+                await db.execute("COMMIT")
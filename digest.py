@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from outbox import ON_SENT_DIGEST_MESSAGE, truncate_utf16, utf16_length
+
+logger = logging.getLogger(__name__)
+
+DIGEST_COLUMNS = "id, department_id, full_name, problem, status_id, request_type_id"
+# Ограничение Telegram на длину текста сообщения, в единицах UTF-16
+MESSAGE_LIMIT = 4096
+
+
+class DigestManager:
+    """Сводки заявок для админ-чатов при всплеске обращений.
+
+    Если за последние window секунд в чат пришло больше rate заявок, новые
+    заявки без фото не отправляются по одной, а копятся в открытой сводке
+    (таблица digests) и через delay секунд уходят одним сообщением.
+    Сводка хранится в БД, поэтому после перезапуска неотправленные сводки
+    досылаются. render(rows) -> (text, reply_markup) формирует сообщение.
+
+    Сводка закрывается, когда в ней max_requests заявок или когда ее текст
+    вместе с заголовком длиннее max_length единиц UTF-16.
+    """
+
+    def __init__(self, pool, outbox, render, rate=10, window=60, delay=60, max_requests=30,
+                 max_length=4000):
+        self.pool = pool
+        self.outbox = outbox
+        self.render = render
+        self.rate = rate
+        self.window = window
+        self.delay = delay
+        self.max_requests = max_requests
+        self.max_length = max_length
+        self._arrivals = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def note_arrival(self, chat_id):
+        """Учитывает новую заявку в чате, возвращает True, если в нем сейчас режим сводок."""
+        now = time.monotonic()
+        arrivals = self._arrivals.setdefault(chat_id, deque())
+        arrivals.append(now)
+        while arrivals and arrivals[0] < now - self.window:
+            arrivals.popleft()
+        return self.rate > 0 and len(arrivals) > self.rate
+
+    async def add(self, db, request_id, chat_id):
+        """Добавляет заявку в открытую сводку. db — соединение внутри pool.transaction()."""
+        now = time.time()
+        cursor = await db.execute(
+            "SELECT id FROM digests WHERE status = 'open' AND chat_id = ? ORDER BY id DESC LIMIT 1",
+            (chat_id,)
+        )
+        row = await cursor.fetchone()
+        if row is not None:
+            digest_id = row[0]
+            await db.execute("UPDATE requests SET digest_id = ? WHERE id = ?", (digest_id, request_id))
+            # Проверяется сводка уже с новой заявкой: и число заявок, и длина текста
+            rows = await self._load(db, digest_id)
+            text, _ = self.render(rows)
+            if len(rows) > self.max_requests or utf16_length(text) > self.max_length:
+                # Заполненная сводка уходит сразу без новой заявки, заявка открывает новую
+                await db.execute("UPDATE digests SET flush_at = ? WHERE id = ?", (now, digest_id))
+                row = None
+        if row is None:
+            cursor = await db.execute(
+                "INSERT INTO digests (chat_id, created_at, flush_at) VALUES (?, ?, ?)",
+                (chat_id, now, now + self.delay)
+            )
+            digest_id = cursor.lastrowid
+            await db.execute("UPDATE requests SET digest_id = ? WHERE id = ?", (digest_id, request_id))
+        self._wakeup.set()
+        return digest_id
+
+    async def _load(self, db, digest_id):
+        cursor = await db.execute(
+            f"SELECT {DIGEST_COLUMNS} FROM requests WHERE digest_id = ? ORDER BY department_id, id",
+            (digest_id,)
+        )
+        return await cursor.fetchall()
+
+    def _render(self, rows):
+        text, markup = self.render(rows)
+        # add() держит сводку в пределах max_length; обрезка — на случай
+        # одной заявки с очень длинными полями
+        return truncate_utf16(text, MESSAGE_LIMIT), markup
+
+    async def enqueue_edit(self, db, digest_id):
+        """Перерисовывает отправленную сводку после смены статуса одной из ее заявок.
+
+        Пока сводка не отправлена, делать ничего не нужно: она будет собрана
+        с актуальными статусами. Правки одной сводки схлопываются в outbox.
+        """
+        cursor = await db.execute("SELECT status, chat_id FROM digests WHERE id = ?", (digest_id,))
+        row = await cursor.fetchone()
+        if row is None or row[0] != "sent":
+            return
+        chat_id = row[1]
+        rows = await self._load(db, digest_id)
+        if not rows:
+            return
+        text, markup = self._render(rows)
+        await self.outbox.enqueue(
+            db, chat_id, "edit_message_text",
+            coalesce_key=f"digest_edit:{digest_id}",
+            request_id=rows[0][0],
+            text=text,
+            reply_markup=markup
+        )
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                delay = await self.flush_due()
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сводки заявок: {e}")
+                delay = self.delay
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def flush_due(self):
+        """Ставит в outbox созревшие сводки, возвращает паузу до следующей."""
+        now = time.time()
+        sent = 0
+        async with self.pool.transaction() as db:
+            cursor = await db.execute(
+                "SELECT id, chat_id FROM digests WHERE status = 'open' AND flush_at <= ? ORDER BY id",
+                (now,)
+            )
+            for digest_id, chat_id in await cursor.fetchall():
+                rows = await self._load(db, digest_id)
+                if rows:
+                    text, markup = self._render(rows)
+                    await self.outbox.enqueue(
+                        db, chat_id, "send_message",
+                        request_id=rows[0][0],
+                        on_sent=ON_SENT_DIGEST_MESSAGE,
+                        text=text,
+                        reply_markup=markup
+                    )
+                    sent += len(rows)
+                await db.execute("UPDATE digests SET status = 'sent' WHERE id = ?", (digest_id,))
+
+            cursor = await db.execute("SELECT MIN(flush_at) FROM digests WHERE status = 'open'")
+            (next_flush,) = await cursor.fetchone()
+
+        if sent:
+            self.outbox.wake()
+            logger.info(f"Отправлена сводка из {sent} заявок")
+        if next_flush is None:
+            return self.delay
+        return max(0.0, next_flush - time.time())
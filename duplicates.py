@@ -0,0 +1,52 @@
+import hashlib
+import re
+
+from lookups import OPEN_STATUS_IDS
+
+# Повторные обращения: заявка, описание которой после нормализации совпадает
+# с недавней открытой заявкой того же пользователя или того же отдела,
+# не создается заново, а присоединяется к существующей (таблица request_duplicates).
+# Функции с db вызываются внутри pool.transaction().
+
+_WORD = re.compile(r"\w+")
+
+
+def problem_fingerprint(problem):
+    """Хеш описания без учета регистра, ё/е, пунктуации и порядка слов."""
+    words = _WORD.findall(problem.lower().replace("ё", "е"))
+    return hashlib.sha1(" ".join(sorted(set(words))).encode()).hexdigest()[:16]
+
+
+async def find_duplicate(db, user_id, department_id, request_type_id, fingerprint, since):
+    """Самая новая открытая заявка с тем же описанием, созданная не раньше since (секунды Unix)."""
+    cursor = await db.execute(
+        """SELECT id FROM requests
+        WHERE problem_hash = ? AND request_type_id = ?
+        AND (user_id = ? OR department_id = ?)
+        AND status_id IN (?, ?) AND created_at >= ?
+        ORDER BY id DESC
+        LIMIT 1""",
+        (fingerprint, request_type_id, user_id, department_id, *OPEN_STATUS_IDS, since)
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def attach_duplicate(db, request_id, user_id, username, full_name, problem, created_at):
+    cursor = await db.execute(
+        """INSERT INTO request_duplicates (request_id, user_id, username, full_name, problem, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)""",
+        (request_id, user_id, username, full_name, problem, created_at)
+    )
+    return cursor.lastrowid
+
+
+async def load_subscribers(db, request_id, owner_id):
+    """[(user_id, user_message_id)] присоединившихся к заявке, кроме ее автора, по одному на пользователя."""
+    cursor = await db.execute(
+        """SELECT user_id, MAX(user_message_id) FROM request_duplicates
+        WHERE request_id = ? AND user_id != ?
+        GROUP BY user_id""",
+        (request_id, owner_id)
+    )
+    return await cursor.fetchall()
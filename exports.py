@@ -0,0 +1,109 @@
+import csv
+import gzip
+import importlib.util
+import io
+import sqlite3
+import tempfile
+
+from aiogram.types import InputFile
+
+EXPORT_BATCH_SIZE = 1000
+# Пока файл меньше этого размера, он хранится в памяти, дальше — на диске
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+EXPORT_HEADER = ["№", "Дата", "Тип", "Отдел", "ФИО", "Логин", "Описание", "Статус"]
+# Справочники маленькие, поэтому названия подставляются прямо в запросе:
+# выгрузка идет в отдельном потоке со своим соединением
+EXPORT_QUERY = """SELECT r.id, datetime(r.created_at, 'unixepoch', 'localtime'), t.name, d.name,
+        r.full_name, r.username, r.problem, s.code
+    FROM requests_all r
+    JOIN request_types t ON t.id = r.request_type_id
+    JOIN departments d ON d.id = r.department_id
+    JOIN statuses s ON s.id = r.status_id
+    WHERE r.created_at >= ? AND r.created_at < ?
+    ORDER BY r.created_at, r.id"""
+EXPORT_STATUSES = {"new": "Новая", "working": "В работе", "done": "Решена"}
+
+
+def xlsx_available():
+    # XLSX-выгрузка необязательна; openpyxl импортируется только при выгрузке
+    return importlib.util.find_spec("openpyxl") is not None
+
+
+def iter_rows(database, query, params, batch_size=EXPORT_BATCH_SIZE):
+    # Отдельное read-only соединение: выполняется в потоке, не в event loop
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        cursor = connection.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                *values, status = row
+                yield [*values, EXPORT_STATUSES.get(status, status)]
+    finally:
+        connection.close()
+
+
+def write_csv(rows, fileobj):
+    # utf-8-sig и ";" — чтобы Excel с русской локалью открыл файл без мастера импорта
+    with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6) as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8-sig", newline="")
+        try:
+            writer = csv.writer(text, delimiter=";")
+            writer.writerow(EXPORT_HEADER)
+            count = 0
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        finally:
+            # detach, чтобы закрытие обертки не закрыло gzip раньше времени
+            text.flush()
+            text.detach()
+    return count
+
+
+def write_xlsx(rows, fileobj):
+    from openpyxl import Workbook
+
+    # write_only: строки сразу уходят во временный XML, а не копятся в памяти
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заявки")
+    sheet.append(EXPORT_HEADER)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(fileobj)
+    return count
+
+
+def export_requests(database, params, export_format):
+    """Выгрузка заявок за период в сжатый файл. Вызывается в отдельном потоке.
+
+    Возвращает (файл с позицией в начале, число строк, размер в байтах).
+    """
+    fileobj = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        rows = iter_rows(database, EXPORT_QUERY, params)
+        writer = write_xlsx if export_format == "xlsx" else write_csv
+        count = writer(rows, fileobj)
+        size = fileobj.tell()
+        fileobj.seek(0)
+    except BaseException:
+        fileobj.close()
+        raise
+    return fileobj, count, size
+
+
+class FileObjectInputFile(InputFile):
+    """Отправка открытого файла (в т.ч. SpooledTemporaryFile) порциями, без чтения целиком."""
+
+    def __init__(self, fileobj, filename, chunk_size=64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.fileobj = fileobj
+
+    async def read(self, bot):
+        self.fileobj.seek(0)
+        while chunk := self.fileobj.read(self.chunk_size):
+            yield chunk
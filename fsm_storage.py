@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("state", "data", "loaded_at", "touched_at")
+
+    def __init__(self, state, data, now):
+        self.state = state
+        self.data = data
+        self.loaded_at = now
+        self.touched_at = now
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_storage той же базы данных.
+
+    Состояния читаются через кэш в памяти процесса, изменения копятся
+    и записываются пачкой раз в flush_interval секунд (write-behind).
+    Неизмененная запись кэша считается актуальной cache_ttl секунд, после
+    чего перечитывается из БД — так несколько процессов бота видят
+    изменения друг друга. При flush_interval=0 каждая запись сразу уходит в БД.
+    Сессии, не менявшиеся session_ttl секунд, удаляются.
+    """
+
+    def __init__(self, pool, flush_interval=0.5, cache_ttl=2.0, session_ttl=24 * 3600, cleanup_interval=600):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.session_ttl = session_ttl
+        self.cleanup_interval = cleanup_interval
+        self._cache = {}
+        self._dirty = set()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    @staticmethod
+    def _key(key):
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.business_connection_id or ''}:{key.destiny}"
+
+    def start(self):
+        if self.flush_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        last_cleanup = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_cleanup >= self.cleanup_interval:
+                    await self.cleanup()
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении состояний FSM: {e}")
+
+    async def _entry(self, key):
+        storage_key = self._key(key)
+        now = time.monotonic()
+        entry = self._cache.get(storage_key)
+        if entry is not None and (storage_key in self._dirty or now - entry.loaded_at < self.cache_ttl):
+            return storage_key, entry
+
+        async with self.pool.acquire() as db:
+            cursor = await db.execute("SELECT state, data FROM fsm_storage WHERE key = ?", (storage_key,))
+            row = await cursor.fetchone()
+        if row is None:
+            entry = _Entry(None, {}, now)
+        else:
+            entry = _Entry(row[0], json.loads(row[1]), now)
+        self._cache[storage_key] = entry
+        return storage_key, entry
+
+    async def _changed(self, storage_key, entry):
+        now = time.monotonic()
+        entry.loaded_at = now
+        entry.touched_at = now
+        self._dirty.add(storage_key)
+        if self.flush_interval <= 0:
+            await self.flush()
+
+    async def set_state(self, key, state=None):
+        storage_key, entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        await self._changed(storage_key, entry)
+
+    async def get_state(self, key):
+        _, entry = await self._entry(key)
+        return entry.state
+
+    async def set_data(self, key, data):
+        storage_key, entry = await self._entry(key)
+        entry.data = dict(data)
+        await self._changed(storage_key, entry)
+
+    async def get_data(self, key):
+        _, entry = await self._entry(key)
+        return dict(entry.data)
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            now = time.time()
+            for storage_key in dirty:
+                entry = self._cache.get(storage_key)
+                if entry is None:
+                    continue
+                if entry.state is None and not entry.data:
+                    # Завершенная сессия: строка не нужна, кэш тоже
+                    deletes.append((storage_key,))
+                else:
+                    upserts.append((storage_key, entry.state, json.dumps(entry.data, ensure_ascii=False), now))
+
+            try:
+                async with self.pool.transaction() as db:
+                    if upserts:
+                        await db.executemany(
+                            """INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET
+                                state = excluded.state, data = excluded.data, updated_at = excluded.updated_at""",
+                            upserts
+                        )
+                    if deletes:
+                        await db.executemany("DELETE FROM fsm_storage WHERE key = ?", deletes)
+            except BaseException:
+                # Не теряем изменения: попробуем записать их при следующем проходе
+                self._dirty |= {row[0] for row in upserts}
+                self._dirty |= {row[0] for row in deletes}
+                raise
+
+            # Запись кэша удаляем только после COMMIT и только если сессия
+            # не изменилась, пока шла транзакция
+            for storage_key, in deletes:
+                entry = self._cache.get(storage_key)
+                if entry is not None and storage_key not in self._dirty and entry.state is None and not entry.data:
+                    del self._cache[storage_key]
+
+    async def cleanup(self):
+        """Удаляет брошенные сессии из БД и из кэша."""
+        async with self.pool.transaction() as db:
+            cursor = await db.execute(
+                "DELETE FROM fsm_storage WHERE updated_at < ?",
+                (time.time() - self.session_ttl,)
+            )
+            removed = cursor.rowcount
+        now = time.monotonic()
+        stale = [
+            storage_key for storage_key, entry in self._cache.items()
+            if storage_key not in self._dirty and now - entry.touched_at > min(self.session_ttl, self.cleanup_interval)
+        ]
+        for storage_key in stale:
+            del self._cache[storage_key]
+        if removed:
+            logger.info(f"Удалено брошенных сессий FSM: {removed}")
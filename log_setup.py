@@ -0,0 +1,151 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+logger = logging.getLogger(__name__)
+
+# Поля обрабатываемого обновления Telegram для всех записей лога внутри него:
+# update_id, user_id, handler; обработчики заявок добавляют request_id
+# через bind_log_context
+log_context = ContextVar("log_context", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Логгеры, которые пишут по строке на каждое обновление или HTTP-запрос
+SAMPLED_LOGGERS = (__name__, "aiohttp.access")
+
+
+def bind_log_context(**fields):
+    """Добавляет поля в log_context текущего обновления (вне обновления — ничего)."""
+    context = log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class ContextQueueHandler(QueueHandler):
+    """Кладет запись в очередь вместе с полями log_context.
+
+    В потоке, который пишет в лог (обычно event loop), только собирается
+    текст сообщения; форматирование и вывод выполняет поток QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        context = log_context.get()
+        record.context = dict(context) if context else None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение и поля контекста."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        entry.update(getattr(record, "fields", None) or {})
+        if getattr(record, "sample_rate", None):
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Оставляет каждую rate-ю запись уровня INFO и ниже от логгеров loggers.
+
+    Первая запись всегда проходит, предупреждения и ошибки не отбрасываются.
+    В оставленных записях sample_rate = rate, чтобы при подсчете умножать.
+    """
+
+    def __init__(self, rate, loggers):
+        super().__init__()
+        self.rate = rate
+        self.loggers = frozenset(loggers)
+        self._counts = {}
+
+    def filter(self, record):
+        if self.rate <= 1 or record.levelno > logging.INFO or record.name not in self.loggers:
+            return True
+        count = self._counts.get(record.name, 0)
+        self._counts[record.name] = count + 1
+        if count % self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+def setup_logging(level=logging.INFO, log_format="json", sample_rate=1):
+    """Логирование через очередь: вызывающий код никогда не ждет вывода.
+
+    log_format — "json" или "text" (прежний формат basicConfig).
+    Строку о каждом обновлении aiogram заменяет LogContextMiddleware.
+    Возвращает запущенный QueueListener, он останавливается при выходе.
+    """
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    listener = QueueListener(log_queue, stream)
+
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rate, SAMPLED_LOGGERS))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Outer middleware обновлений: заполняет log_context и пишет итог с длительностью."""
+
+    async def __call__(self, handler, event, data):
+        context = {"update_id": event.update_id}
+        user = data.get("event_from_user")
+        if user is not None:
+            context["user_id"] = user.id
+        token = log_context.set(context)
+        started = time.perf_counter()
+        handled = False
+        try:
+            response = await handler(event, data)
+            handled = response is not UNHANDLED
+            return response
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(
+                f"Обновление {event.update_id} {'обработано' if handled else 'не обработано'} за {duration_ms} мс",
+                extra={"fields": {"event": event.event_type, "handled": handled, "duration_ms": duration_ms}}
+            )
+            log_context.reset(token)
+
+
+class HandlerLogContextMiddleware(BaseMiddleware):
+    """Inner middleware: добавляет в log_context имя обработчика."""
+
+    async def __call__(self, handler, event, data):
+        context = log_context.get()
+        handler_object = data.get("handler")
+        if context is not None and handler_object is not None:
+            context["handler"] = handler_object.callback.__name__
+        return await handler(event, data)
@@ -0,0 +1,53 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Статусы заявок фиксированы, id совпадают с таблицей statuses (миграция 13)
+STATUS_IDS = {"new": 1, "working": 2, "done": 3}
+STATUS_CODES = {status_id: code for code, status_id in STATUS_IDS.items()}
+# Незакрытые заявки: для подстановки в SQL как "status_id IN (...)"
+OPEN_STATUS_IDS = (STATUS_IDS["new"], STATUS_IDS["working"])
+
+
+class Lookups:
+    """Справочники отделов и типов заявок (таблицы departments и request_types).
+
+    В requests хранятся только id, названия для показа берутся отсюда.
+    Справочники только растут: load() добавляет недостающие названия из
+    списков бота и перечитывает таблицы, id уже сохраненных строк не меняются.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._department_ids = {}
+        self._departments = {}
+        self._request_type_ids = {}
+        self._request_types = {}
+
+    async def load(self, departments=(), request_types=()):
+        async with self.pool.transaction() as db:
+            await db.executemany("INSERT OR IGNORE INTO departments (name) VALUES (?)", [(name,) for name in departments])
+            await db.executemany("INSERT OR IGNORE INTO request_types (name) VALUES (?)", [(name,) for name in request_types])
+            cursor = await db.execute("SELECT id, name FROM departments")
+            department_rows = await cursor.fetchall()
+            cursor = await db.execute("SELECT id, name FROM request_types")
+            request_type_rows = await cursor.fetchall()
+
+        self._departments = dict(department_rows)
+        self._department_ids = {name: department_id for department_id, name in department_rows}
+        self._request_types = dict(request_type_rows)
+        self._request_type_ids = {name: type_id for type_id, name in request_type_rows}
+        logger.info(f"Справочники загружены: отделов {len(department_rows)}, типов заявок {len(request_type_rows)}")
+
+    def department_id(self, name):
+        """id отдела или None, если такого отдела нет."""
+        return self._department_ids.get(name)
+
+    def department(self, department_id):
+        return self._departments.get(department_id, "?")
+
+    def request_type_id(self, name):
+        return self._request_type_ids.get(name)
+
+    def request_type(self, request_type_id):
+        return self._request_types.get(request_type_id, "?")
@@ -1,51 +1,132 @@
+import html
 import logging
+import os
 import re
-import aiosqlite
 import asyncio
-from datetime import datetime
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart, Command
+import tempfile
+import time
+from datetime import datetime, timedelta
+from aiogram import Bot, Dispatcher, Router, types, F
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     ReplyKeyboardMarkup,
     KeyboardButton,
     ReplyKeyboardRemove,
-    InputMediaPhoto
+    ReplyParameters
 )
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
-from io import BytesIO
-from reportlab.lib.enums import TA_JUSTIFY
-from reportlab.platypus import SimpleDocTemplate, Spacer
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from database import ConnectionPool
+from migrations import MIGRATIONS
+from reports import ReportRenderer, ReportRendererBusy
+from report_cache import ReportCache
+from request_cache import RequestCache
+from outbox import ON_SENT_ADMIN_MESSAGE, Outbox, truncate_utf16, utf16_length
+from fsm_storage import SQLiteStorage
+from webhook import run_webhook
+from exports import FileObjectInputFile, export_requests, xlsx_available
+from archive import Archiver
+from digest import DigestManager
+from routing import ANY, RoutingTable
+from lookups import OPEN_STATUS_IDS, STATUS_CODES, STATUS_IDS, Lookups
+from throttling import ThrottlingMiddleware
+from duplicates import attach_duplicate, find_duplicate, load_subscribers, problem_fingerprint
+from sla import load_sla, record_request_created, record_status_change
+from log_setup import HandlerLogContextMiddleware, LogContextMiddleware, bind_log_context, setup_logging
+from metrics import (
+    HandlerMetricsMiddleware,
+    MetricsRegistry,
+    TelegramMetricsMiddleware,
+    start_metrics_server
 )
+
 logger = logging.getLogger(__name__)
 
-# Конфигурация
-BOT_TOKEN = "bot_token"
-ADMIN_CHAT_ID = chat_id
-ADMIN_ID = id_adm
-DATABASE_NAME = "name.db"
+# Конфигурация (значения можно переопределить переменными окружения)
+BOT_TOKEN = os.getenv("BOT_TOKEN", "bot_token")
+# Чат по умолчанию — для заявок, которым не нашлось маршрута (/routes);
+# ADMIN_ID управляет маршрутами и может все
+ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", "0"))
+ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
+DATABASE_NAME = os.getenv("DATABASE_NAME", "name.db")
+DATABASE_POOL_SIZE = 4
+REPORT_WORKERS = 2
+REPORT_QUEUE_SIZE = 4
+LARGE_REPORT_ROWS = 5000
+REPORT_CACHE_SIZE = 64
+# Кэш строк заявок для кнопок статуса и страниц /my_requests (число записей)
+REQUEST_CACHE_RECORDS = 1000
+REQUEST_CACHE_PAGES = 1000
+# Воркеры отчетов (с reportlab) запускаются в фоне через REPORT_WARMUP_DELAY
+# секунд после старта бота; без прогрева — при первом /generate_reports
+REPORT_WARMUP = os.getenv("REPORT_WARMUP", "1") == "1"
+REPORT_WARMUP_DELAY = 5
+MY_REQUESTS_PAGE_SIZE = 5
+FSM_FLUSH_INTERVAL = 0.5
+FSM_SESSION_TTL = 24 * 3600
+BULK_PAGE_SIZE = 30
+OUTBOX_CONCURRENCY = 16
+SEARCH_PAGE_SIZE = 5
+# Ограничение Telegram на длину подписи к фото (в единицах UTF-16, см. utf16_length)
+CAPTION_LIMIT = 1024
+# Ограничение Bot API на размер отправляемого файла
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
 
-# Инициализация бота
-storage = MemoryStorage()
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=storage)
+# Архив: решенные заявки старше ARCHIVE_AFTER_DAYS переносятся в requests_archive
+# раз в ARCHIVE_INTERVAL секунд (0 дней — архив отключен)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH_SIZE = 500
+# Однократный полный VACUUM для включения incremental auto_vacuum в старой БД:
+# на время его работы запись в БД останавливается, поэтому только по явному запросу
+ARCHIVE_FULL_VACUUM = os.getenv("ARCHIVE_FULL_VACUUM", "0") == "1"
+
+# Сводки: если за DIGEST_WINDOW секунд приходит больше DIGEST_RATE заявок,
+# новые заявки без фото собираются и через DIGEST_DELAY секунд уходят
+# в админ-чат одним сообщением (0 — сводки отключены)
+DIGEST_RATE = int(os.getenv("DIGEST_RATE", "20"))
+DIGEST_WINDOW = int(os.getenv("DIGEST_WINDOW", "60"))
+DIGEST_DELAY = int(os.getenv("DIGEST_DELAY", "30"))
+DIGEST_MAX_REQUESTS = 30
+# Длина текста сводки с заголовком, в единицах UTF-16 (предел Telegram — 4096)
+DIGEST_MAX_LENGTH = 4000
+
+# Ограничение частоты для одного пользователя (администраторов не касается):
+# событий в секунду и сколько подряд
+THROTTLE_MESSAGE_RATE = 0.5
+THROTTLE_MESSAGE_BURST = 10
+THROTTLE_CALLBACK_RATE = 1.0
+THROTTLE_CALLBACK_BURST = 10
+# Повторным считается обращение с тем же описанием, пока похожая заявка
+# открыта и создана не раньше чем DUPLICATE_WINDOW_HOURS часов назад
+DUPLICATE_WINDOW_HOURS = 24
+
+# Режим запуска: "polling" или "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "32"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+
+# Метрики: в режиме webhook /metrics отдается тем же сервером,
+# в режиме polling — отдельным на METRICS_PORT (0 — не запускать)
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Объекты бота создаются в setup(), а не при импорте: процессы пула отчетов
+# (spawn) заново импортируют main.py, и в них не нужны ни бот, ни пул БД,
+# ни поток логирования. Обработчики регистрируются в router
+metrics = pool = storage = bot = dp = None
+routing = lookups = outbox = digests = archiver = None
+report_renderer = report_cache = request_cache = None
+router = Router()
 
 # Клавиатуры
 departments = ["Административно-управленческий", "Бухгалтерия", "Продажи", "Маркетинг", "Логистика/Снабжение", "Дизайн", "Веб-разработка", "Тех Контроль", "Инженерно-техническая служба", "Контроль качества", "Планово-экономический", "Питер", "Парифарм", "Воскресенка", "Склад"]
@@ -88,6 +169,26 @@ def get_admin_keyboard(request_id):
         ]
     )
 
+def render_digest(rows):
+    """Текст и кнопки сводки: заявки сгруппированы по отделам, по строке кнопок на заявку."""
+    lines = [f"📥 Сводка заявок: {len(rows)}"]
+    buttons = []
+    department_id = None
+    for req_id, req_department_id, full_name, problem, status_id, type_id in rows:
+        if req_department_id != department_id:
+            department_id = req_department_id
+            lines.append(f"\n🏢 {lookups.department(department_id)}")
+        icon = SEARCH_STATUS_ICONS.get(STATUS_CODES.get(status_id), "❓")
+        lines.append(
+            f"{icon} #{req_id} {lookups.request_type(type_id)} · {full_name}\n"
+            f"    {problem[:60]}{'...' if len(problem) > 60 else ''}"
+        )
+        buttons.append([
+            InlineKeyboardButton(text=f"🔄 #{req_id}", callback_data=f"status_working_{req_id}"),
+            InlineKeyboardButton(text=f"✔️ #{req_id}", callback_data=f"status_done_{req_id}"),
+        ])
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons)
+
 # Состояния FSM
 class RequestForm(StatesGroup):
     request_type = State()
@@ -98,61 +199,173 @@ class RequestForm(StatesGroup):
 
 # Инициализация базы данных
 async def init_db():
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            username TEXT,
-            full_name TEXT NOT NULL,
-            department TEXT NOT NULL,
-            request_type TEXT NOT NULL,
-            problem TEXT NOT NULL,
-            photo_id TEXT,
-            status TEXT DEFAULT 'new',
-            created_at TEXT NOT NULL,
-            admin_message_id INTEGER
-        )
-        """)
-        await db.commit()
-        logger.info("Проверка базы данных выполнена")
+    version = await pool.migrate(MIGRATIONS)
+    logger.info(f"Проверка базы данных выполнена (версия схемы {version})")
+    await lookups.load(departments, request_types)
+    await routing.load()
         
-# Команда для просмотра заявок
-@dp.message(Command("my_requests"))
+# Команда для просмотра заявок.
+# Постраничный вывод по ключу (created_at, id): читается только текущая страница,
+# кнопки ◀/▶ и фильтры редактируют одно и то же сообщение.
+# callback_data: mr|<статус>|<тип>|<направление>|<created_at>|<id>
+MY_REQUESTS_STATUS_FILTERS = [("a", "Все"), ("new", "🆕"), ("working", "🔄"), ("done", "✔️")]
+MY_REQUESTS_TYPE_FILTERS = [("a", "Все типы"), ("0", "🚨"), ("1", "🛒")]
+MY_REQUESTS_STATUSES = {"new": ("🆕", "Новая"), "working": ("🔄", "В работе"), "done": ("✔️", "Решена")}
+
+async def load_requests_page(user_id, status_filter="a", type_filter="a", direction="n", cursor=None):
+    # Повторный просмотр без изменений заявок не обращается к БД (request_cache)
+    cache_key = (status_filter, type_filter, direction, cursor)
+    page = request_cache.get_page(user_id, cache_key)
+    if page is not None:
+        return page
+    token = request_cache.page_token()
+
+    conditions = ["user_id = ?"]
+    params = [user_id]
+    if status_filter != "a":
+        conditions.append("status_id = ?")
+        params.append(STATUS_IDS[status_filter])
+    if type_filter != "a":
+        conditions.append("request_type_id = ?")
+        params.append(lookups.request_type_id(request_types[int(type_filter)]))
+
+    # "n" — более старые заявки (вперед по списку), "p" — более новые (назад)
+    order = "DESC"
+    if cursor is not None:
+        if direction == "p":
+            conditions.append("(created_at, id) > (?, ?)")
+            order = "ASC"
+        else:
+            conditions.append("(created_at, id) < (?, ?)")
+        params.extend(cursor)
+
+    query = f"""SELECT id, problem, status_id, created_at, request_type_id
+        FROM {{table}}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY created_at {order}, id {order}
+        LIMIT ?"""
+    params.append(MY_REQUESTS_PAGE_SIZE + 1)
+
+    async with pool.acquire() as db:
+        cursor_db = await db.execute(query.format(table="requests"), params)
+        rows = await cursor_db.fetchall()
+
+        # В архиве только решенные заявки, и все они старше boundary. Горячей таблицы
+        # достаточно, если страница заполнена и целиком новее архива (или листаем к новым
+        # от точки новее архива); иначе читаем вместе с архивом
+        if status_filter in ("a", "done"):
+            boundary = await archive_boundary(db, "user_id", user_id)
+            if boundary is not None:
+                if order == "ASC":
+                    needs_archive = cursor[0] <= boundary
+                else:
+                    needs_archive = len(rows) <= MY_REQUESTS_PAGE_SIZE or rows[-1][3] <= boundary
+                if needs_archive:
+                    cursor_db = await db.execute(query.format(table="requests_all"), params)
+                    rows = await cursor_db.fetchall()
+
+    has_more = len(rows) > MY_REQUESTS_PAGE_SIZE
+    rows = rows[:MY_REQUESTS_PAGE_SIZE]
+    if order == "ASC":
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = cursor is not None, has_more
+    page = (rows, has_newer, has_older)
+    request_cache.put_page(user_id, cache_key, page, token)
+    return page
+
+def format_requests_page(requests):
+    response = ["📋 Ваши заявки:"]
+
+    for req_id, problem, status_id, created_at, type_id in requests:
+        date = datetime.fromtimestamp(created_at).strftime("%d.%m.%Y")
+        icon, label = MY_REQUESTS_STATUSES.get(STATUS_CODES.get(status_id), ("❓", "?"))
+        response.append(
+            f"\n{icon} {lookups.request_type(type_id)} #{req_id}\n"
+            f"📅 {date} | Статус: {label}\n"
+            f"📝 {problem[:50]}{'...' if len(problem) > 50 else ''}"
+        )
+    return "\n".join(response)
+
+def get_my_requests_keyboard(requests, status_filter, type_filter, has_newer, has_older):
+    navigation = []
+    if has_newer:
+        created_at, req_id = requests[0][3], requests[0][0]
+        navigation.append(InlineKeyboardButton(
+            text="◀", callback_data=f"mr|{status_filter}|{type_filter}|p|{created_at}|{req_id}"
+        ))
+    if has_older:
+        created_at, req_id = requests[-1][3], requests[-1][0]
+        navigation.append(InlineKeyboardButton(
+            text="▶", callback_data=f"mr|{status_filter}|{type_filter}|n|{created_at}|{req_id}"
+        ))
+
+    statuses = [
+        InlineKeyboardButton(
+            text=f"• {label}" if value == status_filter else label,
+            callback_data=f"mr|{value}|{type_filter}|f||"
+        )
+        for value, label in MY_REQUESTS_STATUS_FILTERS
+    ]
+    types_row = [
+        InlineKeyboardButton(
+            text=f"• {label}" if value == type_filter else label,
+            callback_data=f"mr|{status_filter}|{value}|f||"
+        )
+        for value, label in MY_REQUESTS_TYPE_FILTERS
+    ]
+    rows = [navigation] if navigation else []
+    return InlineKeyboardMarkup(inline_keyboard=rows + [statuses, types_row])
+
+@router.message(Command("my_requests"))
 async def show_my_requests(message: types.Message):
     try:
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute(
-                """SELECT id, problem, status, created_at, request_type 
-                FROM requests 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC""",
-                (message.from_user.id,)
-            )
-            requests = await cursor.fetchall()
+        requests, has_newer, has_older = await load_requests_page(message.from_user.id)
 
         if not requests:
             await message.answer("📭 У вас нет активных заявок")
             return
 
-        response = ["📋 Ваши заявки:"]
-        status_icons = {"Новая": "🆕", "В работе": "🔄", "Решена": "✔️"}
-        
-        for req_id, problem, status, created_at, req_type in requests:
-            date = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-            response.append(
-                f"\n{status_icons.get(status, '❓')} {req_type} #{req_id}\n"
-                f"📅 {date} | Статус: {status.capitalize()}\n"
-                f"📝 {problem[:50]}{'...' if len(problem) > 50 else ''}"
-            )
-
-        await message.answer("\n".join(response))
+        await message.answer(
+            format_requests_page(requests),
+            reply_markup=get_my_requests_keyboard(requests, "a", "a", has_newer, has_older)
+        )
     except Exception as e:
         logger.error(f"Ошибка при получении заявок: {e}")
         await message.answer("⚠️ Произошла ошибка при получении списка заявок")
 
+@router.callback_query(F.data.startswith("mr|"))
+async def paginate_my_requests(callback: types.CallbackQuery):
+    try:
+        _, status_filter, type_filter, direction, created_at, req_id = callback.data.split("|")
+        cursor = (int(created_at), int(req_id)) if direction in ("n", "p") else None
+        requests, has_newer, has_older = await load_requests_page(
+            callback.from_user.id, status_filter, type_filter, direction, cursor
+        )
+
+        if requests:
+            text = format_requests_page(requests)
+        else:
+            text = "📭 Нет заявок по выбранным фильтрам"
+        try:
+            await callback.message.edit_text(
+                text,
+                reply_markup=get_my_requests_keyboard(requests, status_filter, type_filter, has_newer, has_older)
+            )
+        except TelegramBadRequest as e:
+            # Повторное нажатие на уже выбранный фильтр
+            if "message is not modified" not in e.message:
+                raise
+        await callback.answer()
+    except ValueError:
+        await callback.answer("Ошибка в формате запроса", show_alert=True)
+    except Exception as e:
+        logger.error(f"Ошибка при получении заявок: {e}")
+        await callback.answer("⚠️ Произошла ошибка при получении списка заявок", show_alert=True)
+
 # Обработчики команд
-@dp.message(CommandStart())
+@router.message(CommandStart())
 async def cmd_start(message: types.Message):
     await message.answer(
         "👋 Привет! Я бот для подачи заявок на IT-проблемы.\n\n"
@@ -166,7 +379,7 @@ async def cmd_start(message: types.Message):
         )
     )
 
-@dp.callback_query(F.data == "create_request")
+@router.callback_query(F.data == "create_request")
 async def start_request(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.answer(
         "Выберите тип заявки:",
@@ -174,7 +387,7 @@ async def start_request(callback: types.CallbackQuery, state: FSMContext):
     )
     await state.set_state(RequestForm.request_type)
 
-@dp.message(Command("create_request"))
+@router.message(Command("create_request"))
 async def cmd_create_request(message: types.Message, state: FSMContext):
     await message.answer(
         "Выберите тип заявки:",
@@ -182,9 +395,94 @@ async def cmd_create_request(message: types.Message, state: FSMContext):
     )
     await state.set_state(RequestForm.request_type)
 
-@dp.message(Command("generate_reports"))
+# Виды отчетов: тип заявки и заголовок
+REPORT_KINDS = {
+    "problems": ("🚨 Проблема (что-то сломалось)", "Отчет по проблемам"),
+    "purchases": ("🛒 Закупка оборудования", "Отчет по закупкам"),
+}
+
+# {table} — requests или, если период задевает архив, requests_all;
+# {departments} — пусто или фильтр по отделам администратора (см. report_scope)
+REPORT_QUERY = """SELECT id, created_at, full_name, problem, status_id
+    FROM {table}
+    WHERE request_type_id = ?
+    AND created_at >= ? AND created_at < ?{departments}
+    ORDER BY created_at"""
+
+REPORT_COUNT_QUERY = """SELECT COUNT(*)
+    FROM {table}
+    WHERE request_type_id = ?
+    AND created_at >= ? AND created_at < ?{departments}"""
+
+async def archive_boundary(db, column, value):
+    """Самая поздняя дата заявки в архиве по индексированному столбцу (user_id или request_type_id)."""
+    cursor = await db.execute(
+        f"SELECT MAX(created_at) FROM requests_archive WHERE {column} = ?", (value,)
+    )
+    (boundary,) = await cursor.fetchone()
+    return boundary
+
+def day_range(start_date, end_date):
+    """Полуоткрытый диапазон [начало start_date, начало дня после end_date) в секундах Unix."""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+def report_title(kind, departments):
+    title = REPORT_KINDS[kind][1]
+    if departments:
+        title += f" ({', '.join(sorted(departments))})"
+    return title
+
+async def get_data_version():
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT value FROM meta WHERE key = 'data_version'")
+        (version,) = await cursor.fetchone()
+    return version
+
+async def render_report(request_type, departments, range_start, range_end, title, filename):
+    """departments — None (все отделы) или набор названий отделов для отчета."""
+    request_type_id = lookups.request_type_id(request_type)
+    department_ids = sorted({lookups.department_id(name) for name in departments or ()} - {None})
+    params = (request_type_id, range_start, range_end, *department_ids)
+    department_filter = ""
+    if departments:
+        department_filter = f"\n    AND department_id IN ({', '.join('?' * len(department_ids))})"
+    async with pool.acquire() as db:
+        # Архив читается, только если период начинается не позже последней архивной заявки
+        boundary = await archive_boundary(db, "request_type_id", request_type_id)
+        table = "requests_all" if boundary is not None and range_start <= boundary else "requests"
+        query = REPORT_QUERY.format(table=table, departments=department_filter)
+        cursor = await db.execute(REPORT_COUNT_QUERY.format(table=table, departments=department_filter), params)
+        (total,) = await cursor.fetchone()
+        if total <= LARGE_REPORT_ROWS:
+            cursor = await db.execute(query, params)
+            rows = await cursor.fetchall()
+
+    started = time.perf_counter()
+    if total <= LARGE_REPORT_ROWS:
+        pdf = await report_renderer.render(rows, title)
+        metrics.observe("bot_report_render_seconds", (("mode", "classic"),), time.perf_counter() - started)
+        return types.BufferedInputFile(pdf, filename=filename)
+
+    # Большой отчет: воркер сам читает строки порциями и пишет PDF во временный файл,
+    # который затем отправляется с диска без копирования в память
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        await report_renderer.render_large(DATABASE_NAME, query, params, title, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    metrics.observe("bot_report_render_seconds", (("mode", "large"),), time.perf_counter() - started)
+    return types.FSInputFile(path, filename=filename)
+
+@router.message(Command("generate_reports"))
 async def generate_reports(message: types.Message):
-    if message.from_user.id != ADMIN_ID:
+    # Администраторы чатов получают отчеты только по своим маршрутам (отделам и типам)
+    scopes = {kind: routing.report_scope(message.from_user.id, REPORT_KINDS[kind][0]) for kind in REPORT_KINDS}
+    scopes = {kind: scope for kind, scope in scopes.items() if scope is None or scope}
+    if not scopes:
         await message.answer("Эта команда доступна только администратору")
         return
 
@@ -215,141 +513,120 @@ async def generate_reports(message: types.Message):
             return
 
     try:
-        # 1. Загружаем данные из базы с фильтрацией по дате
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute(
-                """SELECT id, created_at, full_name, problem, status 
-                FROM requests 
-                WHERE request_type = ? 
-                AND date(created_at) BETWEEN date(?) AND date(?)
-                ORDER BY created_at""",
-                ("🚨 Проблема (что-то сломалось)", start_date, end_date)
-            )
-            problems = await cursor.fetchall()
+        # Диапазон полуоткрытый [start, end + 1 день), чтобы запрос шёл по индексу
+        # (request_type_id, created_at), а не вычислял date() для каждой строки
+        range_start, range_end = day_range(start_date, end_date)
 
-            cursor = await db.execute(
-                """SELECT id, created_at, full_name, problem, status 
-                FROM requests 
-                WHERE request_type = ? 
-                AND date(created_at) BETWEEN date(?) AND date(?)
-                ORDER BY created_at""",
-                ("🛒 Закупка оборудования", start_date, end_date)
-            )
-            purchases = await cursor.fetchall()
+        # Версию читаем до выборки: если данные изменятся во время формирования,
+        # отчет попадет в кэш под старой версией и просто не будет переиспользован
+        data_version = await get_data_version()
+        cache_keys = {
+            kind: (kind, scope and tuple(sorted(scope)), start_date, end_date, data_version)
+            for kind, scope in scopes.items()
+        }
+        documents = {kind: report_cache.get(key) for kind, key in cache_keys.items()}
+        missing = [kind for kind, file_id in documents.items() if file_id is None]
 
-        # 2. Регистрируем шрифты
-        try:
-            pdfmetrics.registerFont(TTFont('DejaVu', 'DejaVuSans.ttf'))
-            pdfmetrics.registerFont(TTFont('DejaVu-Bold', 'DejaVuSans-Bold.ttf'))
-            main_font = 'DejaVu'
-        except:
-            main_font = 'Helvetica'
-            await message.answer("⚠️ Используются стандартные шрифты")
-
-        # 3. Создаем стили для переноса текста
-        styles = getSampleStyleSheet()
-        style_normal = styles["BodyText"]
-        style_normal.fontName = main_font
-        style_normal.fontSize = 8
-        style_normal.leading = 10
-        style_normal.alignment = TA_JUSTIFY
-
-        # 4. Функция для создания PDF
-        def create_pdf(data, title):
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            width, height = A4
-            
-            # Стиль для заголовка
-            style_title = styles["Title"]
-            style_title.fontName = f"{main_font}-Bold" if f"{main_font}-Bold" in pdfmetrics.getRegisteredFontNames() else main_font
-            style_title.fontSize = 16
-            style_title.leading = 18
-            style_title.spaceAfter = 12
-    
-            # Стиль для подзаголовка
-            style_subtitle = styles["BodyText"]
-            style_subtitle.fontName = main_font
-            style_subtitle.fontSize = 12
-            style_subtitle.leading = 14
-    
-            elements = []
-    
-            # Заголовок с явным указанием шрифта
-            elements.append(Paragraph(f"<font name='{main_font}'><b>{title}</b></font>", style_title))
-    
-            # Подзаголовок с датой
-            elements.append(Paragraph(
-                f"<font name='{main_font}'>Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}</font>",
-                style_subtitle
-            ))
-    
-            elements.append(Spacer(1, 12))
-            
-            # Подготовка данных таблицы
-            table_data = [
-                [
-                    Paragraph("<b>№</b>", style_normal),
-                    Paragraph("<b>Дата</b>", style_normal),
-                    Paragraph("<b>Заявитель</b>", style_normal),
-                    Paragraph("<b>Описание</b>", style_normal),
-                    Paragraph("<b>Статус</b>", style_normal)
-                ]
-            ]
-            
-            for row in data:
-                date = datetime.strptime(row[1], "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-                table_data.append([
-                    Paragraph(str(row[0]), style_normal),
-                    Paragraph(date, style_normal),
-                    Paragraph(row[2], style_normal),
-                    Paragraph(row[3], style_normal),
-                    Paragraph(row[4], style_normal)
-                ])
-            
-            # Создаем таблицу с адаптивными размерами
-            table = Table(table_data, colWidths=[30, 60, 120, None, 60])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('WORDWRAP', (0, 0), (-1, -1), True),
-            ]))
-            
-            elements.append(table)
-            doc.build(elements)
-            buffer.seek(0)
-            return buffer
-
-        # 5. Создаем и отправляем отчеты
-        await message.answer(f"Формирую отчеты за период: {start_date} - {end_date}")
-
-        problems_pdf = create_pdf(problems, f"Отчет по проблемам ({start_date} - {end_date})")
-        await bot.send_document(
-            chat_id=message.from_user.id,
-            document=types.BufferedInputFile(
-                problems_pdf.getvalue(),
-                filename=f"problems_report_{start_date}_{end_date}.pdf"
-            ),
-            caption=f"Отчет по проблемам за {start_date} - {end_date}"
-        )
+        if missing:
+            await message.answer(f"Формирую отчеты за период: {start_date} - {end_date}")
 
-        purchases_pdf = create_pdf(purchases, f"Отчет по закупкам ({start_date} - {end_date})")
-        await bot.send_document(
-            chat_id=message.from_user.id,
-            document=types.BufferedInputFile(
-                purchases_pdf.getvalue(),
-                filename=f"purchases_report_{start_date}_{end_date}.pdf"
+        # Недостающие отчеты формируются параллельно в пуле процессов
+        results = await asyncio.gather(
+            *(
+                render_report(
+                    REPORT_KINDS[kind][0], scopes[kind], range_start, range_end,
+                    f"{report_title(kind, scopes[kind])} ({start_date} - {end_date})",
+                    f"{kind}_report_{start_date}_{end_date}.pdf"
+                )
+                for kind in missing
             ),
-            caption=f"Отчет по закупкам за {start_date} - {end_date}"
+            return_exceptions=True
         )
+        try:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            documents.update(zip(missing, results))
+
+            for kind, document in documents.items():
+                sent = await bot.send_document(
+                    chat_id=message.from_user.id,
+                    document=document,
+                    caption=f"{report_title(kind, scopes[kind])} за {start_date} - {end_date}"
+                )
+                # Повторно отправляем уже загруженный в Telegram файл по file_id
+                if kind in missing:
+                    report_cache.put(cache_keys[kind], sent.document.file_id)
+        finally:
+            # Большие отчеты лежат во временных файлах
+            for result in results:
+                if isinstance(result, types.FSInputFile):
+                    os.remove(result.path)
 
+    except ReportRendererBusy:
+        await message.answer("⏳ Сейчас формируется слишком много отчетов, попробуйте через пару минут")
     except Exception as e:
         logger.error(f"Ошибка при формировании отчетов: {e}")
         await message.answer("⚠️ Произошла ошибка при формировании отчетов")
 
+# Выгрузка заявок в CSV (gzip) или XLSX: строки читаются курсором порциями
+# в отдельном потоке и сразу пишутся в сжатый временный файл
+@router.message(Command("export"))
+async def cmd_export(message: types.Message):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    usage = "Используйте: /export csv|xlsx [YYYY-MM-DD] [YYYY-MM-DD]"
+    args = message.text.split()[1:]
+    if not args or args[0].lower() not in ("csv", "xlsx"):
+        await message.answer(usage)
+        return
+    export_format = args[0].lower()
+    if export_format == "xlsx" and not xlsx_available():
+        await message.answer("⚠️ Выгрузка в XLSX недоступна (не установлен openpyxl), используйте csv")
+        return
+
+    date_format = "%Y-%m-%d"
+    start_date = "1970-01-01"
+    end_date = "2099-12-31"
+    if len(args) >= 3:
+        try:
+            start_date, end_date = args[1], args[2]
+            datetime.strptime(start_date, date_format)
+            datetime.strptime(end_date, date_format)
+        except ValueError:
+            await message.answer(f"⚠️ Неверный формат дат. {usage}")
+            return
+        if start_date > end_date:
+            await message.answer("⚠️ Начальная дата не может быть позже конечной")
+            return
+
+    fileobj = None
+    try:
+        await message.answer("Формирую выгрузку...")
+        fileobj, count, size = await asyncio.to_thread(
+            export_requests, DATABASE_NAME, day_range(start_date, end_date), export_format
+        )
+        if size > EXPORT_MAX_BYTES:
+            await message.answer("⚠️ Выгрузка больше 50 МБ, укажите период покороче")
+            return
+
+        suffix = "xlsx" if export_format == "xlsx" else "csv.gz"
+        filename = f"requests_{start_date}_{end_date}.{suffix}"
+        await message.answer_document(
+            FileObjectInputFile(fileobj, filename=filename),
+            caption=f"Заявок: {count}"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке заявок: {e}")
+        await message.answer("⚠️ Произошла ошибка при выгрузке заявок")
+    finally:
+        if fileobj is not None:
+            fileobj.close()
+
 # Обработка заявки
-@dp.message(RequestForm.request_type)
+@router.message(RequestForm.request_type)
 async def process_request_type(message: types.Message, state: FSMContext):
     if message.text not in request_types:
         await message.answer("Пожалуйста, выберите тип заявки из предложенных вариантов.")
@@ -362,7 +639,7 @@ async def process_request_type(message: types.Message, state: FSMContext):
     )
     await state.set_state(RequestForm.department)
 
-@dp.message(RequestForm.department)
+@router.message(RequestForm.department)
 async def process_department(message: types.Message, state: FSMContext):
     if message.text not in departments:
         await message.answer("Пожалуйста, выберите отдел из предложенных вариантов.")
@@ -378,7 +655,7 @@ async def process_department(message: types.Message, state: FSMContext):
 )
     await state.set_state(RequestForm.full_name)
 
-@dp.message(RequestForm.full_name)
+@router.message(RequestForm.full_name)
 async def process_full_name(message: types.Message, state: FSMContext):
     # Проверяем ФИО
     if not re.match(r"^[А-ЯЁ][а-яё]+\s[А-ЯЁ][а-яё]+\s[А-ЯЁ][а-яё]+$", message.text):
@@ -403,8 +680,12 @@ async def process_full_name(message: types.Message, state: FSMContext):
     await message.answer(prompt)
     await state.set_state(RequestForm.problem)
     
-@dp.message(RequestForm.problem)
+@router.message(RequestForm.problem)
 async def process_problem(message: types.Message, state: FSMContext):
+    if not message.text:
+        # Фото и стикеры на этом шаге не принимаются: описание обязательно
+        await message.answer("Пожалуйста, опишите проблему текстом.")
+        return
     await state.update_data(problem=message.text)
     await message.answer(
         "Хотите прикрепить фото/скрин к заявке?",
@@ -412,96 +693,152 @@ async def process_problem(message: types.Message, state: FSMContext):
     )
     await state.set_state(RequestForm.photo)
 
-@dp.message(RequestForm.photo, F.text == "⏭ Пропустить")
+@router.message(RequestForm.photo, F.text == "⏭ Пропустить")
 async def skip_photo(message: types.Message, state: FSMContext):
     await state.update_data(photo=None)
     await finish_request(message, state)
 
-@dp.message(RequestForm.photo, F.text == "📷 Прикрепить фото/скрин")
+@router.message(RequestForm.photo, F.text == "📷 Прикрепить фото/скрин")
 async def request_photo(message: types.Message, state: FSMContext):
     await message.answer("Отправьте фото или скрин проблемы:", reply_markup=ReplyKeyboardRemove())
 
-@dp.message(RequestForm.photo, F.photo)
+@router.message(RequestForm.photo, F.photo)
 async def process_photo(message: types.Message, state: FSMContext):
     photo_id = message.photo[-1].file_id  # Берем самое высокое качество
     await state.update_data(photo=photo_id)
     await finish_request(message, state)
 
-@dp.message(RequestForm.photo)
+@router.message(RequestForm.photo)
 async def wrong_photo_input(message: types.Message):
     await message.answer("Пожалуйста, отправьте фото или выберите действие из меню.")
 
+async def save_request(db, message, data, created_at, admin_chat_id, problem_hash):
+    """Сохраняет заявку и ставит в outbox сообщение для админ-чата, возвращает ID заявки."""
+    # Сохраняем заявку в БД
+    cursor = await db.execute(
+        """INSERT INTO requests 
+        (user_id, username, full_name, department_id, request_type_id, problem, photo_id, status_id, created_at, admin_chat_id, problem_hash) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            message.from_user.id,
+            message.from_user.username,
+            data["full_name"],
+            lookups.department_id(data["department"]),
+            lookups.request_type_id(data["request_type"]),
+            data["problem"],
+            data.get("photo"),
+            STATUS_IDS["new"],
+            created_at,
+            admin_chat_id,
+            problem_hash
+        )
+    )
+    request_id = cursor.lastrowid
+    await record_request_created(db, request_id, data["department"], data["request_type"], created_at)
+
+    # Формируем текст заявки
+    request_text = (
+        f"{data['request_type']} #{request_id}\n"
+        f"👤 ФИО: {data['full_name']}\n"
+        f"🔗 Логин: @{data.get('username', message.from_user.username)}\n"  # Исправлено здесь
+        f"🏢 Отдел: {data['department']}\n"
+        f"📝 Описание: {data['problem']}\n"
+        f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
+        f"🆕 Статус: Новая"
+    )
+    # Отправляем заявку админу
+    burst = digests.note_arrival(admin_chat_id)
+    if burst and not data.get("photo"):
+        # Всплеск заявок: заявка попадет в ближайшую сводку
+        await digests.add(db, request_id, admin_chat_id)
+    elif data.get("photo") and utf16_length(request_text) <= CAPTION_LIMIT:
+        # Фото, подпись и кнопки одним сообщением, статус потом меняется правкой подписи.
+        # ID сообщения сохраняется в admin_message_id после отправки
+        await db.execute(
+            "UPDATE requests SET admin_message_is_caption = 1 WHERE id = ?",
+            (request_id,)
+        )
+        await outbox.enqueue(
+            db, admin_chat_id, "send_photo",
+            request_id=request_id,
+            on_sent=ON_SENT_ADMIN_MESSAGE,
+            photo=data["photo"],
+            caption=request_text,
+            reply_markup=get_admin_keyboard(request_id)
+        )
+    elif data.get("photo"):
+        # Описание не помещается в подпись: фото отдельно, карточка с кнопками — текстом
+        await outbox.enqueue(
+            db, admin_chat_id, "send_photo",
+            photo=data["photo"],
+            caption=f"{data['request_type']} #{request_id}"
+        )
+        await outbox.enqueue(
+            db, admin_chat_id, "send_message",
+            request_id=request_id,
+            on_sent=ON_SENT_ADMIN_MESSAGE,
+            text=request_text,
+            reply_markup=get_admin_keyboard(request_id)
+        )
+    else:
+        # Если фото нет, просто отправляем текст
+        await outbox.enqueue(
+            db, admin_chat_id, "send_message",
+            request_id=request_id,
+            on_sent=ON_SENT_ADMIN_MESSAGE,
+            text=request_text,
+            reply_markup=get_admin_keyboard(request_id)
+        )
+    return request_id
+
+async def confirm_duplicate(message, request_id, duplicate_id):
+    """Сообщает пользователю, что обращение присоединено к открытой заявке request_id."""
+    sent = await message.answer(
+        f"🔁 Похожая заявка #{request_id} уже зарегистрирована и еще не решена.\n\n"
+        f"Ваше обращение присоединено к ней, уведомления о смене статуса придут сюда.",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    async with pool.transaction() as db:
+        await db.execute(
+            "UPDATE request_duplicates SET user_message_id = ? WHERE id = ?",
+            (sent.message_id, duplicate_id)
+        )
+
 async def finish_request(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    now = datetime.now()
+    created_at = int(now.timestamp())
+    admin_chat_id = routing.chat_for(data["department"], data["request_type"])
     
     try:
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            # Сохраняем заявку в БД
-            cursor = await db.execute(
-                """INSERT INTO requests 
-                (user_id, username, full_name, department, request_type, problem, photo_id, status, created_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    message.from_user.id,
-                    message.from_user.username,
-                    data["full_name"],
-                    data["department"],
-                    data["request_type"],
-                    data["problem"],
-                    data.get("photo"),
-                    "new",
-                    created_at
+        problem_hash = problem_fingerprint(data["problem"])
+        # Заявка и сообщения для админ-чата сохраняются одной транзакцией,
+        # отправкой занимается фоновая задача outbox
+        async with pool.transaction() as db:
+            # Повторное обращение присоединяется к открытой заявке. Заявки с фото
+            # несут новую информацию и всегда создаются отдельно
+            duplicate_of = None
+            if not data.get("photo"):
+                since = created_at - DUPLICATE_WINDOW_HOURS * 3600
+                duplicate_of = await find_duplicate(
+                    db, message.from_user.id, lookups.department_id(data["department"]),
+                    lookups.request_type_id(data["request_type"]), problem_hash, since
                 )
-            )
-            request_id = cursor.lastrowid
-            await db.commit()
-
-        # Формируем текст заявки
-        request_text = (
-            f"{data['request_type']} #{request_id}\n"
-            f"👤 ФИО: {data['full_name']}\n"
-            f"🔗 Логин: @{data.get('username', message.from_user.username)}\n"  # Исправлено здесь
-            f"🏢 Отдел: {data['department']}\n"
-            f"📝 Описание: {data['problem']}\n"
-            f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
-            f"🆕 Статус: Новая"
-        )
-        # Отправляем заявку админу
-        if data.get("photo"):
-            # Если есть фото, отправляем с фото
-            media = InputMediaPhoto(
-                media=data["photo"],
-                caption=request_text
-            )
-            sent_message = await bot.send_media_group(
-                chat_id=ADMIN_CHAT_ID,
-                media=[media]
-            )
-            # Отправляем клавиатуру отдельным сообщением
-            admin_message = await bot.send_message(
-                chat_id=ADMIN_CHAT_ID,
-                text=f"Действия по заявке #{request_id}:",
-                reply_markup=get_admin_keyboard(request_id)
-            )
-            # Сохраняем ID последнего сообщения (с кнопками)
-            admin_message_id = admin_message.message_id
-        else:
-            # Если фото нет, просто отправляем текст
-            sent_message = await bot.send_message(
-                chat_id=ADMIN_CHAT_ID,
-                text=request_text,
-                reply_markup=get_admin_keyboard(request_id)
-            )
-            admin_message_id = sent_message.message_id
+            if duplicate_of is not None:
+                duplicate_id = await attach_duplicate(
+                    db, duplicate_of, message.from_user.id, message.from_user.username,
+                    data["full_name"], data["problem"], now.strftime("%Y-%m-%d %H:%M:%S")
+                )
+            else:
+                request_id = await save_request(db, message, data, created_at, admin_chat_id, problem_hash)
+        bind_log_context(request_id=duplicate_of if duplicate_of is not None else request_id)
 
-        # Сохраняем ID сообщения в базе данных
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            await db.execute(
-                "UPDATE requests SET admin_message_id = ? WHERE id = ?",
-                (admin_message_id, request_id)
-            )
-            await db.commit()
+        if duplicate_of is not None:
+            await confirm_duplicate(message, duplicate_of, duplicate_id)
+            return
+
+        request_cache.invalidate_user(message.from_user.id)
+        outbox.wake()
 
         # Отправляем подтверждение пользователю
         user_message = (
@@ -512,17 +849,24 @@ async def finish_request(message: types.Message, state: FSMContext):
         )
         
         if data.get("photo"):
-            await bot.send_photo(
-                chat_id=message.from_user.id,
+            sent = await message.answer_photo(
                 photo=data["photo"],
                 caption=user_message + "\n📷 Фото прикреплено"
             )
         else:
-            await message.answer(user_message)
+            sent = await message.answer(user_message)
+
+        # Уведомления о смене статуса отправляются ответом на это сообщение
+        async with pool.transaction() as db:
+            await db.execute(
+                "UPDATE requests SET user_message_id = ? WHERE id = ?",
+                (sent.message_id, request_id)
+            )
+        request_cache.invalidate_record(request_id)
         
         await message.answer(
-            f"🕒 Статус: Новая\n\n"
-            f"Вы можете отслеживать статус через /my_requests",
+            "🕒 Статус: Новая\n\n"
+            "Вы можете отслеживать статус через /my_requests",
             reply_markup=ReplyKeyboardRemove()
         )
 
@@ -535,90 +879,165 @@ async def finish_request(message: types.Message, state: FSMContext):
     finally:
         await state.clear()
 
-@dp.callback_query(F.data.startswith("status_"))
+STATUS_TEXTS = {"working": "🔄 В работе", "done": "✅ Решено"}
+
+async def enqueue_admin_edit(db, request_id, request_data, status_text, admin_username):
+    """Ставит в outbox правку карточки заявки в админ-чате."""
+    _, full_name, department_id, problem, type_id, _, is_caption, _, _, admin_chat_id = request_data
+    admin_chat_id = admin_chat_id or ADMIN_CHAT_ID
+    admin_message = (
+        f"{lookups.request_type(type_id)} #{request_id}\n"
+        f"👤 ФИО: {full_name}\n"
+        f"🔗 Логин: @{admin_username}\n"  # Добавляем эту строку
+        f"🏢 Отдел: {lookups.department(department_id)}\n"
+        f"📝 Описание: {problem}\n"
+        f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
+        f"🕒 Статус: {status_text}"
+    )
+
+    # Правим существующее сообщение: подпись у карточки с фото, текст у остальных
+    # (в том числе у старых заявок с фото, где кнопки были отдельным сообщением).
+    # Повторные клики до отправки схлопываются в одну правку
+    if is_caption:
+        admin_message = truncate_utf16(admin_message, CAPTION_LIMIT)
+        await outbox.enqueue(
+            db, admin_chat_id, "edit_message_caption",
+            coalesce_key=f"admin_edit:{request_id}",
+            request_id=request_id,
+            caption=admin_message,
+            reply_markup=get_admin_keyboard(request_id)
+        )
+    else:
+        await outbox.enqueue(
+            db, admin_chat_id, "edit_message_text",
+            coalesce_key=f"admin_edit:{request_id}",
+            request_id=request_id,
+            text=admin_message,
+            reply_markup=get_admin_keyboard(request_id)
+        )
+
+async def enqueue_status_notifications(db, request_id, request_data, status_text, admin_username):
+    """Ставит в outbox правку сообщения в админ-чате и уведомление пользователю."""
+    user_id, _, _, problem, type_id, photo_id, _, user_message_id, digest_id, _ = request_data
+
+    # 1. Обновляем сообщение администратору
+    if digest_id is not None:
+        # Заявка пришла в сводке — перерисовывается сводка целиком
+        await digests.enqueue_edit(db, digest_id)
+    else:
+        await enqueue_admin_edit(db, request_id, request_data, status_text, admin_username)
+
+    # 2. Отправляем уведомление пользователю — только текст, ответом на
+    # подтверждение заявки (там уже есть фото), без повторной отправки фото
+    user_notification = (
+        f"🔔 Статус вашей заявки #{request_id} обновлён:\n"
+        f"🏷️ Тип: {lookups.request_type(type_id)}\n"
+        f"🔄 Новый статус: {status_text}\n"
+        f"📝 Описание: {problem[:100]}{'...' if len(problem) > 100 else ''}"
+    )
+    if photo_id and not user_message_id:
+        user_notification += "\n📷 К заявке приложено фото"
+
+    reply = None
+    if user_message_id:
+        reply = ReplyParameters(message_id=user_message_id, allow_sending_without_reply=True)
+    await outbox.enqueue(
+        db, user_id, "send_message",
+        text=user_notification,
+        reply_parameters=reply
+    )
+
+    # 3. Тем, чьи повторные обращения присоединены к заявке
+    for subscriber_id, subscriber_message_id in await load_subscribers(db, request_id, user_id):
+        reply = None
+        if subscriber_message_id:
+            reply = ReplyParameters(message_id=subscriber_message_id, allow_sending_without_reply=True)
+        await outbox.enqueue(
+            db, subscriber_id, "send_message",
+            text=user_notification,
+            reply_parameters=reply
+        )
+
+@router.callback_query(F.data.startswith("status_"))
 async def update_status(callback: types.CallbackQuery):
     try:
         _, action, request_id = callback.data.split("_")
         request_id = int(request_id)
+        bind_log_context(request_id=request_id)
         new_status = "working" if action == "working" else "done"
-        status_text = "🔄 В работе" if action == "working" else "✅ Решено"
+        status_text = STATUS_TEXTS[new_status]
 
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            # Получаем данные заявки
-            cursor = await db.execute(
-                """SELECT user_id, full_name, department, problem, request_type, photo_id, admin_message_id 
-                FROM requests WHERE id = ?""",
-                (request_id,)
+        async with pool.transaction() as db:
+            # Неизменяемые поля заявки для проверки прав и уведомлений:
+            # повторные нажатия берут их из request_cache
+            record = request_cache.get_record(request_id)
+            if record is None:
+                cursor = await db.execute(
+                    """SELECT created_at, user_id, full_name, department_id, problem, request_type_id, photo_id,
+                    admin_message_is_caption, user_message_id, digest_id, admin_chat_id
+                    FROM requests WHERE id = ?""",
+                    (request_id,)
+                )
+                record = await cursor.fetchone()
+                if record is not None:
+                    request_cache.put_record(request_id, record)
+            request_data = None
+            if record is not None:
+                created_at, *request_data = record
+            # Менять статус могут администраторы чата, куда ушла заявка (см. /routes)
+            allowed = request_data is not None and routing.can_manage(
+                callback.from_user.id,
+                request_data[-1] or ADMIN_CHAT_ID,
+                callback.message.chat.id if callback.message else None
             )
-            request_data = await cursor.fetchone()
-            
-            if not request_data:
-                await callback.answer("Заявка не найдена", show_alert=True)
-                return
-
-            user_id, full_name, department, problem, req_type, photo_id, admin_message_id = request_data
 
-            # Обновляем статус в базе данных
-            await db.execute(
-                "UPDATE requests SET status = ? WHERE id = ?",
-                (new_status, request_id)
-            )
-            await db.commit()
-
-        # 1. Обновляем сообщение администратору
-        admin_message = (
-            f"{req_type} #{request_id}\n"
-            f"👤 ФИО: {full_name}\n"
-            f"🔗 Логин: @{callback.from_user.username}\n"  # Добавляем эту строку
-            f"🏢 Отдел: {department}\n"
-            f"📝 Описание: {problem}\n"
-            f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
-            f"🕒 Статус: {status_text}"
-        )
-        
-        try:
-            if photo_id:
-                # Если была фотография, редактируем подпись к медиагруппе невозможно,
-                # поэтому отправляем новое текстовое сообщение с кнопками
-                await bot.send_message(
-                    chat_id=ADMIN_CHAT_ID,
-                    text=admin_message,
-                    reply_markup=get_admin_keyboard(request_id)
+            changed = False
+            if allowed:
+                # Статус читается в транзакции записи, а не из кэша: заявку могли
+                # изменить другие процессы бота (webhook с несколькими воркерами)
+                cursor = await db.execute(
+                    "SELECT status_id, first_response_at FROM requests WHERE id = ?",
+                    (request_id,)
                 )
-            else:
-                # Если фото не было, просто редактируем существующее сообщение
-                await bot.edit_message_text(
-                    chat_id=ADMIN_CHAT_ID,
-                    message_id=admin_message_id,
-                    text=admin_message,
-                    reply_markup=get_admin_keyboard(request_id)
+                row = await cursor.fetchone()
+                if row is None:
+                    # Заявку из кэша уже перенесли в архив
+                    request_cache.invalidate_record(request_id)
+                    request_data = None
+                else:
+                    status_id, first_response_at = row
+                    # Повторное нажатие той же кнопки не меняет заявку и не шлет уведомлений
+                    changed = STATUS_CODES[status_id] != new_status
+
+            if changed:
+                # Обновляем статус в базе данных
+                await db.execute(
+                    "UPDATE requests SET status_id = ? WHERE id = ?",
+                    (STATUS_IDS[new_status], request_id)
                 )
-        except Exception as e:
-            logger.error(f"Ошибка при редактировании сообщения: {e}")
-
-        # 2. Отправляем уведомление пользователю
-        user_notification = (
-            f"🔔 Статус вашей заявки #{request_id} обновлён:\n"
-            f"🏷️ Тип: {req_type}\n"
-            f"🔄 Новый статус: {status_text}\n"
-            f"📝 Описание: {problem[:100]}{'...' if len(problem) > 100 else ''}"
-        )
-        
-        try:
-            if photo_id:
-                await bot.send_photo(
-                    chat_id=user_id,
-                    photo=photo_id,
-                    caption=user_notification
+                _, _, department_id, _, type_id, *_ = request_data
+                await record_status_change(
+                    db, request_id, STATUS_CODES[status_id], new_status, callback.from_user.username,
+                    lookups.department(department_id), lookups.request_type(type_id),
+                    created_at, first_response_at
                 )
-            else:
-                await bot.send_message(
-                    chat_id=user_id,
-                    text=user_notification
+                await enqueue_status_notifications(
+                    db, request_id, request_data, status_text, callback.from_user.username
                 )
-        except Exception as e:
-            logger.error(f"Не удалось отправить уведомление пользователю: {e}")
 
+        if changed:
+            request_cache.invalidate_user(request_data[0])
+        if not request_data:
+            await callback.answer("Заявка не найдена", show_alert=True)
+            return
+        if not allowed:
+            await callback.answer("Нет прав на изменение этой заявки", show_alert=True)
+            return
+        if not changed:
+            await callback.answer(f"Заявка #{request_id} уже в статусе: {status_text}")
+            return
+
+        outbox.wake()
         await callback.answer(f"Статус заявки #{request_id} изменён на: {status_text}")
 
     except ValueError:
@@ -627,10 +1046,587 @@ async def update_status(callback: types.CallbackQuery):
         logger.error(f"Ошибка при обновлении статуса: {e}")
         await callback.answer("⚠️ Произошла ошибка при обновлении статуса", show_alert=True)
 
+# Массовая смена статусов.
+# Выбор хранится прямо в клавиатуре сообщения: отмеченные заявки помечены ☑,
+# поэтому между нажатиями не нужно отдельное хранилище.
+# callback_data: bulk_t_<id> — отметить, bulk_all — отметить все,
+# bulk_a_<статус> — применить, bulk_cancel — отмена
+def get_bulk_keyboard(requests, selected):
+    rows = [
+        [InlineKeyboardButton(
+            text=f"{'☑' if req_id in selected else '☐'} #{req_id} {department}",
+            callback_data=f"bulk_t_{req_id}"
+        )]
+        for req_id, department, _ in requests
+    ]
+    rows.append([
+        InlineKeyboardButton(text="☑ Все", callback_data="bulk_all"),
+        InlineKeyboardButton(text="✖ Отмена", callback_data="bulk_cancel"),
+    ])
+    rows.append([
+        InlineKeyboardButton(text="🔄 В работе", callback_data="bulk_a_working"),
+        InlineKeyboardButton(text="✔️ Решено", callback_data="bulk_a_done"),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def parse_bulk_keyboard(markup):
+    """Возвращает заявки из клавиатуры и множество отмеченных."""
+    requests, selected = [], set()
+    for row in markup.inline_keyboard:
+        button = row[0]
+        if not button.callback_data.startswith("bulk_t_"):
+            continue
+        req_id = int(button.callback_data[len("bulk_t_"):])
+        requests.append((req_id, button.text.split(" ", 2)[2], None))
+        if button.text.startswith("☑"):
+            selected.add(req_id)
+    return requests, selected
+
+@router.message(Command("bulk"))
+async def cmd_bulk(message: types.Message):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    try:
+        async with pool.acquire() as db:
+            cursor = await db.execute(
+                """SELECT id, department_id, problem
+                FROM requests
+                WHERE status_id IN (?, ?)
+                ORDER BY created_at DESC
+                LIMIT ?""",
+                (*OPEN_STATUS_IDS, BULK_PAGE_SIZE)
+            )
+            requests = [
+                (req_id, lookups.department(department_id), problem)
+                for req_id, department_id, problem in await cursor.fetchall()
+            ]
+
+        if not requests:
+            await message.answer("📭 Нет открытых заявок")
+            return
+
+        lines = ["🗂 Открытые заявки — отметьте нужные и выберите статус:"]
+        for req_id, department, problem in requests:
+            lines.append(f"#{req_id} · {department} · {problem[:40]}{'...' if len(problem) > 40 else ''}")
+        await message.answer("\n".join(lines), reply_markup=get_bulk_keyboard(requests, set()))
+    except Exception as e:
+        logger.error(f"Ошибка при получении открытых заявок: {e}")
+        await message.answer("⚠️ Произошла ошибка при получении списка заявок")
+
+@router.callback_query(F.data.startswith("bulk_"))
+async def bulk_action(callback: types.CallbackQuery):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Эта команда доступна только администратору", show_alert=True)
+        return
+
+    try:
+        requests, selected = parse_bulk_keyboard(callback.message.reply_markup)
+
+        if callback.data == "bulk_cancel":
+            await callback.message.edit_text("Массовая смена статусов отменена")
+            await callback.answer()
+            return
+
+        if callback.data.startswith("bulk_t_") or callback.data == "bulk_all":
+            if callback.data == "bulk_all":
+                selected = {req_id for req_id, _, _ in requests}
+            else:
+                req_id = int(callback.data[len("bulk_t_"):])
+                selected ^= {req_id}
+            await callback.message.edit_reply_markup(reply_markup=get_bulk_keyboard(requests, selected))
+            await callback.answer()
+            return
+
+        new_status = callback.data[len("bulk_a_"):]
+        if new_status not in STATUS_TEXTS:
+            raise ValueError(callback.data)
+        if not selected:
+            await callback.answer("Не выбрано ни одной заявки", show_alert=True)
+            return
+        status_text = STATUS_TEXTS[new_status]
+
+        # Одна транзакция на все заявки: одно чтение, один UPDATE ... WHERE id IN (...)
+        ids = sorted(selected)
+        bind_log_context(request_id=ids)
+        placeholders = ", ".join("?" * len(ids))
+        async with pool.transaction() as db:
+            cursor = await db.execute(
+                f"""SELECT id, status_id, created_at, first_response_at,
+                user_id, full_name, department_id, problem, request_type_id, photo_id,
+                admin_message_is_caption, user_message_id, digest_id, admin_chat_id
+                FROM requests WHERE id IN ({placeholders})""",
+                ids
+            )
+            found = await cursor.fetchall()
+            # Заявки, уже стоящие в этом статусе, не меняются и уведомлений не получают
+            changed = [row for row in found if STATUS_CODES[row[1]] != new_status]
+            for request_id, status_id, created_at, first_response_at, *request_data in changed:
+                _, _, department_id, _, type_id, *_ = request_data
+                await record_status_change(
+                    db, request_id, STATUS_CODES[status_id], new_status, callback.from_user.username,
+                    lookups.department(department_id), lookups.request_type(type_id),
+                    created_at, first_response_at
+                )
+            if changed:
+                changed_ids = [request_id for request_id, *_ in changed]
+                changed_placeholders = ", ".join("?" * len(changed_ids))
+                await db.execute(
+                    f"UPDATE requests SET status_id = ? WHERE id IN ({changed_placeholders})",
+                    (STATUS_IDS[new_status], *changed_ids)
+                )
+            for request_id, _, _, _, *request_data in changed:
+                await enqueue_status_notifications(
+                    db, request_id, request_data, status_text, callback.from_user.username
+                )
+        for user_id in {user_id for _, _, _, _, user_id, *_ in changed}:
+            request_cache.invalidate_user(user_id)
+        outbox.wake()
+
+        skipped = len(found) - len(changed)
+        if changed:
+            result_text = (
+                f"✅ Статус «{status_text}» установлен для заявок: "
+                + ", ".join(f"#{request_id}" for request_id, *_ in changed)
+            )
+        else:
+            result_text = f"Все выбранные заявки уже в статусе «{status_text}»"
+        if changed and skipped:
+            result_text += f"\nУже были в этом статусе: {skipped}"
+        await callback.message.edit_text(result_text)
+        await callback.answer(f"Обновлено заявок: {len(changed)}")
+
+    except ValueError:
+        await callback.answer("Ошибка в формате запроса", show_alert=True)
+    except Exception as e:
+        logger.error(f"Ошибка при массовой смене статуса: {e}")
+        await callback.answer("⚠️ Произошла ошибка при обновлении статусов", show_alert=True)
+
+# Полнотекстовый поиск по заявкам (FTS5, таблица requests_fts).
+# Текст запроса хранится в данных FSM администратора, в callback_data
+# передается только смещение: search|<offset>
+SEARCH_STATUS_ICONS = {"new": "🆕", "working": "🔄", "done": "✅"}
+# Ранжирование bm25 ведется среди самых новых SEARCH_CANDIDATES совпадений:
+# для слов, которые есть почти в каждой заявке, это ограничивает время поиска
+SEARCH_CANDIDATES = 2000
+SEARCH_QUERY = """SELECT rowid FROM (
+        SELECT rowid, bm25(requests_fts, 10.0, 5.0, 2.0) AS score
+        FROM requests_fts
+        WHERE requests_fts MATCH ?
+        ORDER BY rowid DESC
+        LIMIT ?
+    )
+    ORDER BY score, rowid DESC
+    LIMIT ? OFFSET ?"""
+SEARCH_DETAILS_QUERY = """SELECT r.id, r.created_at, r.department_id, r.status_id, r.full_name,
+    snippet(requests_fts, -1, char(2), char(3), '…', 12)
+    FROM requests_fts
+    JOIN requests_all r ON r.id = requests_fts.rowid
+    WHERE requests_fts MATCH ? AND requests_fts.rowid IN ({})"""
+
+def build_fts_query(text):
+    # Каждое слово — отдельная фраза, все слова обязательны. Кавычки исключают
+    # синтаксис FTS5 (AND, NEAR, *, -) из пользовательского ввода. Поиск по
+    # префиксу не используется: на частых словах он на порядок медленнее
+    words = re.findall(r"\w+", text.lower())[:10]
+    return " ".join(f'"{word}"' for word in words)
+
+async def search_requests(fts_query, offset):
+    async with pool.acquire() as db:
+        cursor = await db.execute(
+            SEARCH_QUERY, (fts_query, SEARCH_CANDIDATES, SEARCH_PAGE_SIZE + 1, offset)
+        )
+        ids = [row[0] for row in await cursor.fetchall()]
+        page_ids = ids[:SEARCH_PAGE_SIZE]
+        if not page_ids:
+            return [], False
+
+        # Сниппеты строятся только для строк текущей страницы
+        cursor = await db.execute(
+            SEARCH_DETAILS_QUERY.format(",".join("?" * len(page_ids))), (fts_query, *page_ids)
+        )
+        details = {row[0]: row for row in await cursor.fetchall()}
+    rows = [details[req_id] for req_id in page_ids if req_id in details]
+    return rows, len(ids) > SEARCH_PAGE_SIZE
+
+def format_search_results(query, rows, offset):
+    lines = [f"🔎 Результаты по запросу «{html.escape(query)}»:"]
+    for number, (req_id, created_at, department_id, status_id, full_name, snippet) in enumerate(rows, offset + 1):
+        date = datetime.fromtimestamp(created_at).strftime("%d.%m.%Y")
+        snippet = html.escape(snippet).replace("\x02", "<b>").replace("\x03", "</b>")
+        lines.append(
+            f"\n{number}. {SEARCH_STATUS_ICONS.get(STATUS_CODES.get(status_id), '❓')} #{req_id} · {date} · "
+            f"{html.escape(lookups.department(department_id))} · {html.escape(full_name)}\n{snippet}"
+        )
+    return "\n".join(lines)
+
+def get_search_keyboard(offset, has_more):
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            text="◀", callback_data=f"search|{max(0, offset - SEARCH_PAGE_SIZE)}"
+        ))
+    if has_more:
+        navigation.append(InlineKeyboardButton(
+            text="▶", callback_data=f"search|{offset + SEARCH_PAGE_SIZE}"
+        ))
+    return InlineKeyboardMarkup(inline_keyboard=[navigation]) if navigation else None
+
+@router.message(Command("search"))
+async def cmd_search(message: types.Message, state: FSMContext):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    query = message.text.partition(" ")[2].strip()
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        await message.answer("Использование: /search <текст>\nНапример: /search принтер бухгалтерия")
+        return
+
+    try:
+        rows, has_more = await search_requests(fts_query, 0)
+        if not rows:
+            await message.answer("Ничего не найдено")
+            return
+
+        await state.update_data(search_query=query)
+        await message.answer(
+            format_search_results(query, rows, 0),
+            reply_markup=get_search_keyboard(0, has_more),
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при поиске заявок: {e}")
+        await message.answer("⚠️ Произошла ошибка при поиске")
+
+@router.callback_query(F.data.startswith("search|"))
+async def paginate_search(callback: types.CallbackQuery, state: FSMContext):
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("Эта команда доступна только администратору", show_alert=True)
+        return
+
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+        return
+
+    try:
+        offset = int(callback.data.split("|")[1])
+        rows, has_more = await search_requests(build_fts_query(query), offset)
+        if not rows:
+            await callback.answer("Больше результатов нет")
+            return
+
+        await callback.message.edit_text(
+            format_search_results(query, rows, offset),
+            reply_markup=get_search_keyboard(offset, has_more),
+            parse_mode=ParseMode.HTML
+        )
+        await callback.answer()
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Ошибка при листании результатов поиска: {e}")
+        await callback.answer("⚠️ Произошла ошибка при поиске", show_alert=True)
+
+# Сводка SLA по отделам: строится только по агрегатам daily_rollups (sla.py)
+def format_duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours} ч {minutes} мин"
+    return f"{hours // 24} д {hours % 24} ч"
+
+def format_sla(rows, start_date, end_date):
+    lines = [f"⏱ SLA за {start_date} — {end_date}"]
+    totals = [0, 0, 0, 0.0, 0, 0.0, 0]
+    for department, *values in rows:
+        opened, closed, response_count, response_seconds, resolution_count, resolution_seconds, backlog = values
+        if not (opened or closed or backlog):
+            continue
+        totals = [total + (value or 0) for total, value in zip(totals, values)]
+        response = format_duration(response_seconds / response_count) if response_count else "—"
+        resolution = format_duration(resolution_seconds / resolution_count) if resolution_count else "—"
+        lines.append(
+            f"\n🏢 {department}\n"
+            f"Создано: {opened}, решено: {closed}, открыто сейчас: {backlog}\n"
+            f"Реакция: {response}, решение: {resolution}"
+        )
+
+    opened, closed, response_count, response_seconds, resolution_count, resolution_seconds, backlog = totals
+    response = format_duration(response_seconds / response_count) if response_count else "—"
+    resolution = format_duration(resolution_seconds / resolution_count) if resolution_count else "—"
+    lines.append(
+        f"\nИтого — создано: {opened}, решено: {closed}, открыто сейчас: {backlog}\n"
+        f"Среднее время реакции: {response}, решения: {resolution}"
+    )
+    return "\n".join(lines)
+
+@router.message(Command("sla"))
+async def cmd_sla(message: types.Message):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    args = message.text.split()[1:]
+    date_format = "%Y-%m-%d"
+    end_date = datetime.now().strftime(date_format)
+    start_date = (datetime.now() - timedelta(days=29)).strftime(date_format)
+    if len(args) >= 2:
+        try:
+            start_date, end_date = args[0], args[1]
+            datetime.strptime(start_date, date_format)
+            datetime.strptime(end_date, date_format)
+        except ValueError:
+            await message.answer("⚠️ Неверный формат дат. Используйте: /sla [YYYY-MM-DD] [YYYY-MM-DD]")
+            return
+        if start_date > end_date:
+            await message.answer("⚠️ Начальная дата не может быть позже конечной")
+            return
+
+    try:
+        async with pool.acquire() as db:
+            rows = await load_sla(db, start_date, end_date)
+        await message.answer(format_sla(rows, start_date, end_date))
+    except Exception as e:
+        logger.error(f"Ошибка при формировании SLA: {e}")
+        await message.answer("⚠️ Произошла ошибка при формировании сводки")
+
+def format_stats_section(title, histograms, limit=10):
+    if not histograms:
+        return f"<b>{title}</b>\nнет данных"
+    # Сначала самые "дорогие" по суммарному времени
+    items = sorted(histograms.items(), key=lambda item: item[1].sum, reverse=True)[:limit]
+    lines = [f"<b>{title}</b>"]
+    for labels, histogram in items:
+        name = ", ".join(str(value) for _, value in labels)
+        avg_ms = histogram.sum / histogram.count * 1000
+        p95_ms = histogram.quantile(0.95) * 1000
+        lines.append(f"{name}: {histogram.count} шт., ср. {avg_ms:.1f} мс, p95 ≤ {p95_ms:.0f} мс")
+    return "\n".join(lines)
+
+def format_stats():
+    handler_errors = sum(metrics.counters("bot_handler_errors_total").values())
+    telegram_errors = sum(metrics.counters("bot_telegram_errors_total").values())
+    retry_after = sum(metrics.counters("bot_telegram_retry_after_total").values())
+    sections = [
+        format_stats_section("Обработчики", metrics.histograms("bot_handler_duration_seconds")),
+        format_stats_section("Запросы к БД", metrics.histograms("bot_db_query_duration_seconds")),
+        format_stats_section("Bot API", metrics.histograms("bot_telegram_request_duration_seconds")),
+        format_stats_section("Отчеты", metrics.histograms("bot_report_render_seconds")),
+        (
+            f"<b>Ошибки</b>\n"
+            f"Обработчики: {handler_errors}\n"
+            f"Bot API: {telegram_errors}, RetryAfter: {retry_after}\n\n"
+            f"<b>Кеш отчетов</b>\n"
+            f"Попадания: {report_cache.hits}, промахи: {report_cache.misses}, записей: {len(report_cache)}\n\n"
+            f"<b>Кеш заявок</b>\n"
+            f"Заявки: попадания {request_cache.record_hits}, промахи {request_cache.record_misses}\n"
+            f"Страницы /my_requests: попадания {request_cache.page_hits}, промахи {request_cache.page_misses}\n"
+            f"Записей: {len(request_cache)}"
+        ),
+    ]
+    return "\n\n".join(sections)
+
+@router.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    await message.answer(format_stats(), parse_mode=ParseMode.HTML)
+
+# Маршруты заявок по чатам администраторов (routing.py), управляет ADMIN_ID:
+# /routes — список, /route_set <chat_id> <отдел или *>[; <тип или *>],
+# /route_del <id>, /chat_admin_add и /chat_admin_del <chat_id> <user_id>
+ROUTES_USAGE = (
+    "Используйте:\n"
+    "/route_set <chat_id> <отдел или *>[; <тип или *>]\n"
+    "/route_del <id>\n"
+    "/chat_admin_add <chat_id> <user_id>\n"
+    "/chat_admin_del <chat_id> <user_id>"
+)
+
+def match_route_value(value, choices):
+    """'*', точное название или однозначная часть названия (без учета регистра)."""
+    value = value.strip()
+    if value == ANY:
+        return ANY
+    matches = [choice for choice in choices if value.lower() in choice.lower()]
+    exact = [choice for choice in matches if choice.lower() == value.lower()]
+    if exact:
+        return exact[0]
+    return matches[0] if len(matches) == 1 else None
+
+def format_routes():
+    chats = sorted({chat_id for *_, chat_id in routing.routes()} | {ADMIN_CHAT_ID})
+    lines = ["<b>Маршруты заявок</b>"]
+    for route_id, department, request_type, chat_id in routing.routes():
+        lines.append(f"{route_id}. {html.escape(department)} · {html.escape(request_type)} → {chat_id}")
+    if len(lines) == 1:
+        lines.append("нет, все заявки уходят в чат по умолчанию")
+    lines.append(f"\nЧат по умолчанию: {ADMIN_CHAT_ID}")
+    lines.append("\n<b>Администраторы чатов</b>")
+    for chat_id in chats:
+        admins = routing.admins(chat_id)
+        lines.append(f"{chat_id}: {', '.join(map(str, admins)) if admins else 'все участники чата'}")
+    return "\n".join(lines)
+
+@router.message(Command("routes", "route_set", "route_del", "chat_admin_add", "chat_admin_del"))
+async def cmd_routes(message: types.Message, command: CommandObject):
+    if not routing.is_superadmin(message.from_user.id):
+        await message.answer("Эта команда доступна только администратору")
+        return
+
+    try:
+        args = (command.args or "").strip()
+        if command.command == "route_set":
+            chat_id, _, rest = args.partition(" ")
+            department, _, request_type = rest.partition(";")
+            department = match_route_value(department, departments)
+            request_type = match_route_value(request_type or ANY, request_types)
+            if department is None or request_type is None:
+                await message.answer("⚠️ Не удалось однозначно определить отдел или тип заявки\n\n" + ROUTES_USAGE)
+                return
+            await routing.set_route(department, request_type, int(chat_id))
+        elif command.command == "route_del":
+            if not await routing.delete_route(int(args)):
+                await message.answer("Маршрут не найден")
+                return
+        elif command.command in ("chat_admin_add", "chat_admin_del"):
+            chat_id, user_id = (int(value) for value in args.split())
+            if command.command == "chat_admin_add":
+                await routing.add_admin(chat_id, user_id)
+            elif not await routing.remove_admin(chat_id, user_id):
+                await message.answer("Администратор не найден")
+                return
+        await message.answer(format_routes(), parse_mode=ParseMode.HTML)
+    except ValueError:
+        await message.answer(ROUTES_USAGE)
+    except Exception as e:
+        logger.error(f"Ошибка при изменении маршрутов: {e}")
+        await message.answer("⚠️ Произошла ошибка при изменении маршрутов")
+
+# Инициализация бота
+def setup():
+    """Логирование, пул БД, бот с диспетчером и фоновые службы. Вызывается до main()."""
+    global metrics, pool, storage, bot, dp, routing, lookups, outbox, digests, archiver
+    global report_renderer, report_cache, request_cache
+
+    # Настройка логирования: записи уходят в очередь, выводит их отдельный поток.
+    # LOG_FORMAT — json (по умолчанию) или text; строки о каждом обновлении
+    # и access-лог webhook пишутся через одну из LOG_INFO_SAMPLE (1 — все)
+    setup_logging(
+        log_format=os.getenv("LOG_FORMAT", "json"),
+        sample_rate=int(os.getenv("LOG_INFO_SAMPLE", "1"))
+    )
+
+    metrics = MetricsRegistry()
+    pool = ConnectionPool(DATABASE_NAME, size=DATABASE_POOL_SIZE, observe_query=metrics.observe_query)
+    storage = SQLiteStorage(pool, flush_interval=FSM_FLUSH_INTERVAL, session_ttl=FSM_SESSION_TTL)
+    bot = Bot(token=BOT_TOKEN)
+    bot.session.middleware(TelegramMetricsMiddleware(metrics))
+    dp = Dispatcher(storage=storage)
+    dp.include_router(router)
+    dp.update.outer_middleware(LogContextMiddleware())
+    routing = RoutingTable(pool, default_chat_id=ADMIN_CHAT_ID, superadmin_id=ADMIN_ID)
+    lookups = Lookups(pool)
+    dp.message.outer_middleware(ThrottlingMiddleware(
+        THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST, exempt=routing.is_admin, metrics=metrics
+    ))
+    dp.callback_query.outer_middleware(ThrottlingMiddleware(
+        THROTTLE_CALLBACK_RATE, THROTTLE_CALLBACK_BURST, exempt=routing.is_admin, metrics=metrics
+    ))
+    dp.message.middleware(HandlerMetricsMiddleware(metrics))
+    dp.callback_query.middleware(HandlerMetricsMiddleware(metrics))
+    dp.message.middleware(HandlerLogContextMiddleware())
+    dp.callback_query.middleware(HandlerLogContextMiddleware())
+    report_renderer = ReportRenderer(max_workers=REPORT_WORKERS, max_queue=REPORT_QUEUE_SIZE)
+    report_cache = ReportCache(max_entries=REPORT_CACHE_SIZE)
+    request_cache = RequestCache(max_records=REQUEST_CACHE_RECORDS, max_pages=REQUEST_CACHE_PAGES)
+    outbox = Outbox(bot, pool, concurrency=OUTBOX_CONCURRENCY)
+    archiver = Archiver(
+        pool, max_age_days=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL, batch_size=ARCHIVE_BATCH_SIZE,
+        full_vacuum=ARCHIVE_FULL_VACUUM
+    )
+
+    metrics.describe("bot_handler_duration_seconds", "Время работы обработчика")
+    metrics.describe("bot_handler_errors_total", "Необработанные исключения в обработчиках")
+    metrics.describe("bot_db_query_duration_seconds", "Время запроса к SQLite вместе с выборкой строк")
+    metrics.describe("bot_telegram_request_duration_seconds", "Время вызова Bot API")
+    metrics.describe("bot_telegram_errors_total", "Ошибки вызовов Bot API")
+    metrics.describe("bot_telegram_retry_after_total", "Ответы RetryAfter от Bot API")
+    metrics.describe("bot_report_render_seconds", "Время формирования PDF-отчета")
+    metrics.describe("bot_throttled_total", "Отброшенные из-за частоты сообщения и нажатия кнопок")
+    metrics.gauge("bot_report_cache_hits", lambda: report_cache.hits, "Попадания в кеш отчетов")
+    metrics.gauge("bot_report_cache_misses", lambda: report_cache.misses, "Промахи кеша отчетов")
+    metrics.gauge("bot_request_cache_record_hits", lambda: request_cache.record_hits, "Попадания в кеш заявок")
+    metrics.gauge("bot_request_cache_record_misses", lambda: request_cache.record_misses, "Промахи кеша заявок")
+    metrics.gauge("bot_request_cache_page_hits", lambda: request_cache.page_hits, "Попадания в кеш страниц /my_requests")
+    metrics.gauge("bot_request_cache_page_misses", lambda: request_cache.page_misses, "Промахи кеша страниц /my_requests")
+    metrics.gauge("bot_report_renderer_pending", lambda: report_renderer.pending, "Отчеты в работе и в очереди")
+
+    digests = DigestManager(
+        pool, outbox, render_digest,
+        rate=DIGEST_RATE, window=DIGEST_WINDOW, delay=DIGEST_DELAY, max_requests=DIGEST_MAX_REQUESTS,
+        max_length=DIGEST_MAX_LENGTH
+    )
+
 # Запуск бота
 async def main():
-    await init_db()
-    await dp.start_polling(bot)
+    await pool.open()
+    report_renderer.start()
+    try:
+        await init_db()
+        storage.start()
+        outbox.start()
+        if DIGEST_RATE > 0:
+            # Сводки, не отправленные до перезапуска, уйдут при первом проходе
+            digests.start()
+        if ARCHIVE_AFTER_DAYS > 0:
+            archiver.start()
+        warmup = None
+        if REPORT_WARMUP:
+            warmup = asyncio.create_task(report_renderer.warm_up(REPORT_WARMUP_DELAY))
+        try:
+            if RUN_MODE == "webhook":
+                await run_webhook(
+                    dp, bot,
+                    url=WEBHOOK_URL + WEBHOOK_PATH,
+                    path=WEBHOOK_PATH,
+                    host=WEBHOOK_HOST,
+                    port=WEBHOOK_PORT,
+                    secret_token=WEBHOOK_SECRET,
+                    concurrency=WEBHOOK_CONCURRENCY,
+                    max_pending=WEBHOOK_MAX_PENDING,
+                    metrics=metrics
+                )
+            else:
+                metrics_runner = None
+                if METRICS_PORT:
+                    metrics_runner = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+                try:
+                    await dp.start_polling(bot)
+                finally:
+                    if metrics_runner is not None:
+                        await metrics_runner.cleanup()
+        finally:
+            if warmup is not None:
+                warmup.cancel()
+            await archiver.stop()
+            await digests.stop()
+            await outbox.stop()
+            await storage.close()
+    finally:
+        report_renderer.shutdown()
+        await pool.close()
 
 if __name__ == "__main__":
+    setup()
     asyncio.run(main())
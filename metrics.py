@@ -0,0 +1,204 @@
+import logging
+import re
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_SQL_TABLE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|TABLE|INDEX|TRIGGER)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def sql_label(sql):
+    """Короткая метка запроса для метрик: "SELECT requests", "INSERT outbox"..."""
+    words = sql.split(None, 1)
+    if not words:
+        return "OTHER"
+    op = words[0].upper()
+    match = _SQL_TABLE.search(sql)
+    return f"{op} {match.group(1)}" if match else op
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля сверху по границам корзин."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Гистограммы и счетчики с метками в памяти процесса, вывод в формате Prometheus."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, func, help_text=""):
+        """Значение, которое вычисляется в момент выгрузки метрик."""
+        self._gauges[name] = func
+        if help_text:
+            self._help[name] = help_text
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe_query(self, sql, seconds):
+        self.observe("bot_db_query_duration_seconds", (("query", sql_label(sql)),), seconds)
+
+    def histograms(self, name):
+        return {labels: histogram for (metric, labels), histogram in self._histograms.items() if metric == name}
+
+    def counters(self, name):
+        return {labels: value for (metric, labels), value in self._counters.items() if metric == name}
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        items = tuple(labels) + tuple(extra)
+        if not items:
+            return ""
+        escaped = (
+            (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in items
+        )
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    def render(self):
+        lines = []
+        names = sorted({name for name, _ in self._histograms})
+        for name in names:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(self.histograms(name).items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+
+        names = sorted({name for name, _ in self._counters})
+        for name in names:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(self.counters(name).items()):
+                lines.append(f"{name}{self._labels(labels)} {value}")
+
+        for name, func in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logger.error(f"Не удалось вычислить метрику {name}: {e}")
+                continue
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время работы каждого обработчика aiogram (внутренний middleware)."""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.registry.inc("bot_handler_errors_total", (("handler", name),))
+            raise
+        finally:
+            self.registry.observe(
+                "bot_handler_duration_seconds", (("handler", name),), time.perf_counter() - started
+            )
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время каждого вызова Bot API, ошибки и RetryAfter (middleware сессии бота)."""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    async def __call__(self, make_request, bot, method):
+        labels = (("method", method.__api_method__),)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            self.registry.inc("bot_telegram_retry_after_total", labels)
+            raise
+        except Exception as e:
+            self.registry.inc("bot_telegram_errors_total", labels + (("error", type(e).__name__),))
+            raise
+        finally:
+            self.registry.observe("bot_telegram_request_duration_seconds", labels, time.perf_counter() - started)
+
+
+def add_metrics_route(app, registry, path="/metrics"):
+    async def metrics_handler(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app.router.add_get(path, metrics_handler)
+
+
+async def start_metrics_server(registry, host, port):
+    """Отдельный HTTP-сервер с /metrics для режима polling."""
+    app = web.Application()
+    add_metrics_route(app, registry)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,510 @@
+# Версионированные миграции схемы. Номер применённой версии хранится
+# в PRAGMA user_version, каждая миграция выполняется в своей транзакции.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            department TEXT NOT NULL,
+            request_type TEXT NOT NULL,
+            problem TEXT NOT NULL,
+            photo_id TEXT,
+            status TEXT DEFAULT 'new',
+            created_at TEXT NOT NULL,
+            admin_message_id INTEGER
+        )
+        """,
+    ]),
+    # Индексы под /my_requests и отчёты: фильтр по равенству + диапазон/сортировка по дате
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_requests_user_created ON requests (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_type_created ON requests (request_type, created_at)",
+        "ANALYZE",
+    ]),
+    # Счетчик версии данных для кэша отчетов: увеличивается триггерами
+    # в той же транзакции, что и создание заявки или смена статуса
+    (3, [
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_version_insert AFTER INSERT ON requests
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_version_status AFTER UPDATE OF status ON requests
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_version_delete AFTER DELETE ON requests
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+    ]),
+    # Постоянная очередь исходящих сообщений Telegram (outbox.Outbox)
+    (4, [
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            coalesce_key TEXT,
+            request_id INTEGER,
+            on_sent TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            revision INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (next_attempt_at)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_coalesce ON outbox (coalesce_key) WHERE coalesce_key IS NOT NULL",
+    ]),
+    # Состояния FSM (fsm_storage.SQLiteStorage)
+    (5, [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated ON fsm_storage (updated_at)",
+    ]),
+    # Полнотекстовый поиск для /search. Отдельная (не external content) таблица FTS5:
+    # rowid = requests.id, синхронизируется триггерами, существующие заявки
+    # переносятся при миграции
+    (6, [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+            problem, full_name, department,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_insert AFTER INSERT ON requests
+        BEGIN
+            INSERT INTO requests_fts (rowid, problem, full_name, department)
+            VALUES (new.id, new.problem, new.full_name, new.department);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_update
+        AFTER UPDATE OF problem, full_name, department ON requests
+        BEGIN
+            UPDATE requests_fts
+            SET problem = new.problem, full_name = new.full_name, department = new.department
+            WHERE rowid = new.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_delete AFTER DELETE ON requests
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = old.id;
+        END
+        """,
+        """
+        INSERT INTO requests_fts (rowid, problem, full_name, department)
+        SELECT id, problem, full_name, department FROM requests
+        WHERE id NOT IN (SELECT rowid FROM requests_fts)
+        """,
+    ]),
+    # История смен статуса и дневные агрегаты для /sla (отдел × тип заявки × день).
+    # Агрегаты обновляются в той же транзакции, что и заявка (sla.py). Для уже
+    # существующих заявок известны только даты создания, поэтому при переносе
+    # заполняются счетчики opened/closed, без времени реакции и решения
+    (7, [
+        """
+        CREATE TABLE IF NOT EXISTS status_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            old_status TEXT,
+            new_status TEXT NOT NULL,
+            changed_by TEXT,
+            created_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_status_events_request ON status_events (request_id, id)",
+        "ALTER TABLE requests ADD COLUMN first_response_at TEXT",
+        "ALTER TABLE requests ADD COLUMN resolved_at TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day TEXT NOT NULL,
+            department TEXT NOT NULL,
+            request_type TEXT NOT NULL,
+            opened INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            reopened INTEGER NOT NULL DEFAULT 0,
+            first_response_count INTEGER NOT NULL DEFAULT 0,
+            first_response_seconds REAL NOT NULL DEFAULT 0,
+            resolution_count INTEGER NOT NULL DEFAULT 0,
+            resolution_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, department, request_type)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO daily_rollups (day, department, request_type, opened, closed)
+        SELECT substr(created_at, 1, 10), department, request_type,
+               COUNT(*), SUM(status = 'done')
+        FROM requests
+        GROUP BY 1, 2, 3
+        """,
+    ]),
+    # Архив решенных заявок (archive.py). Горячая таблица requests остается
+    # небольшой, requests_all объединяет обе для запросов по старым датам.
+    # При переносе в архив строка FTS сохраняется, чтобы /search находил и архив.
+    # Новые колонки requests нужно добавлять и в requests_archive, и в представление
+    (8, [
+        """
+        CREATE TABLE IF NOT EXISTS requests_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            department TEXT NOT NULL,
+            request_type TEXT NOT NULL,
+            problem TEXT NOT NULL,
+            photo_id TEXT,
+            status TEXT,
+            created_at TEXT NOT NULL,
+            admin_message_id INTEGER,
+            first_response_at TEXT,
+            resolved_at TEXT,
+            archived_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_requests_archive_user_created ON requests_archive (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_archive_type_created ON requests_archive (request_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests (status, created_at)",
+        """
+        CREATE VIEW IF NOT EXISTS requests_all AS
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at
+        FROM requests_archive
+        """,
+        # Перенос в архив не меняет содержимое отчетов, поэтому версию данных не трогает
+        "DROP TRIGGER IF EXISTS trg_requests_version_delete",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_version_delete AFTER DELETE ON requests
+        WHEN NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = old.id)
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        "DROP TRIGGER IF EXISTS trg_requests_fts_delete",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_requests_fts_delete AFTER DELETE ON requests
+        WHEN NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = old.id)
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = old.id;
+        END
+        """,
+    ]),
+    # Заявка с фото — одно сообщение send_photo с подписью и кнопками, статус
+    # меняется правкой подписи (admin_message_is_caption = 1). user_message_id —
+    # подтверждение у пользователя, на него ссылаются уведомления о статусе
+    (9, [
+        "ALTER TABLE requests ADD COLUMN admin_message_is_caption INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE requests ADD COLUMN user_message_id INTEGER",
+        "ALTER TABLE requests_archive ADD COLUMN admin_message_is_caption INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE requests_archive ADD COLUMN user_message_id INTEGER",
+        "DROP VIEW IF EXISTS requests_all",
+        """
+        CREATE VIEW requests_all AS
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id
+        FROM requests_archive
+        """,
+    ]),
+    # Сводки заявок для админ-чата при всплеске обращений (digest.py)
+    (10, [
+        """
+        CREATE TABLE IF NOT EXISTS digests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            message_id INTEGER,
+            created_at REAL NOT NULL,
+            flush_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_digests_open ON digests (flush_at) WHERE status = 'open'",
+        "ALTER TABLE requests ADD COLUMN digest_id INTEGER",
+        "ALTER TABLE requests_archive ADD COLUMN digest_id INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_requests_digest ON requests (digest_id) WHERE digest_id IS NOT NULL",
+        "DROP VIEW IF EXISTS requests_all",
+        """
+        CREATE VIEW requests_all AS
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id
+        FROM requests_archive
+        """,
+    ]),
+    (11, [
+        # Маршрутизация заявок по чатам администраторов: '*' — любой отдел / тип
+        """
+        CREATE TABLE IF NOT EXISTS admin_routes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            department TEXT NOT NULL DEFAULT '*',
+            request_type TEXT NOT NULL DEFAULT '*',
+            chat_id INTEGER NOT NULL,
+            UNIQUE (department, request_type)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_admins (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, user_id)
+        ) WITHOUT ROWID
+        """,
+        # NULL — заявка отправлена в чат по умолчанию (ADMIN_CHAT_ID)
+        "ALTER TABLE requests ADD COLUMN admin_chat_id INTEGER",
+        "ALTER TABLE requests_archive ADD COLUMN admin_chat_id INTEGER",
+        "DROP VIEW IF EXISTS requests_all",
+        """
+        CREATE VIEW requests_all AS
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id
+        FROM requests_archive
+        """,
+    ]),
+    (12, [
+        # Хеш нормализованного описания для поиска повторных обращений (duplicates.py)
+        "ALTER TABLE requests ADD COLUMN problem_hash TEXT",
+        "ALTER TABLE requests_archive ADD COLUMN problem_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_requests_problem_hash ON requests (problem_hash) WHERE problem_hash IS NOT NULL",
+        """
+        CREATE TABLE IF NOT EXISTS request_duplicates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT,
+            problem TEXT NOT NULL,
+            user_message_id INTEGER,
+            created_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_request_duplicates_request ON request_duplicates (request_id)",
+        "DROP VIEW IF EXISTS requests_all",
+        """
+        CREATE VIEW requests_all AS
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id, problem_hash
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department, request_type, problem, photo_id, status, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id, problem_hash
+        FROM requests_archive
+        """,
+    ]),
+    # Компактная схема заявок: отдел, тип и статус — целые ссылки на справочники
+    # (строки для показа бот держит в памяти, lookups.py), даты — секунды Unix.
+    # requests и requests_archive пересобираются, старые текстовые даты считаются
+    # локальным временем. Счетчик AUTOINCREMENT сохраняется, строки FTS не меняются
+    (13, [
+        "CREATE TABLE IF NOT EXISTS departments (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS request_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS statuses (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE)",
+        "INSERT OR IGNORE INTO statuses (id, code) VALUES (1, 'new'), (2, 'working'), (3, 'done')",
+        """
+        INSERT OR IGNORE INTO departments (name)
+        SELECT department FROM requests UNION SELECT department FROM requests_archive
+        """,
+        """
+        INSERT OR IGNORE INTO request_types (name)
+        SELECT request_type FROM requests UNION SELECT request_type FROM requests_archive
+        """,
+        "DROP VIEW IF EXISTS requests_all",
+        """
+        CREATE TABLE requests_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            department_id INTEGER NOT NULL REFERENCES departments (id),
+            request_type_id INTEGER NOT NULL REFERENCES request_types (id),
+            problem TEXT NOT NULL,
+            photo_id TEXT,
+            status_id INTEGER NOT NULL DEFAULT 1 REFERENCES statuses (id),
+            created_at INTEGER NOT NULL,
+            admin_message_id INTEGER,
+            first_response_at INTEGER,
+            resolved_at INTEGER,
+            admin_message_is_caption INTEGER NOT NULL DEFAULT 0,
+            user_message_id INTEGER,
+            digest_id INTEGER,
+            admin_chat_id INTEGER,
+            problem_hash TEXT
+        )
+        """,
+        """
+        INSERT INTO requests_new
+        SELECT r.id, r.user_id, r.username, r.full_name, d.id, t.id, r.problem, r.photo_id,
+            COALESCE(s.id, 1),
+            CAST(strftime('%s', r.created_at, 'utc') AS INTEGER),
+            r.admin_message_id,
+            CAST(strftime('%s', r.first_response_at, 'utc') AS INTEGER),
+            CAST(strftime('%s', r.resolved_at, 'utc') AS INTEGER),
+            r.admin_message_is_caption, r.user_message_id, r.digest_id, r.admin_chat_id, r.problem_hash
+        FROM requests r
+        JOIN departments d ON d.name = r.department
+        JOIN request_types t ON t.name = r.request_type
+        LEFT JOIN statuses s ON s.code = r.status
+        """,
+        # Счетчик старой таблицы не меньше id из архива — переносим его
+        "DELETE FROM sqlite_sequence WHERE name = 'requests_new'",
+        "UPDATE sqlite_sequence SET name = 'requests_new' WHERE name = 'requests'",
+        "DROP TABLE requests",
+        "ALTER TABLE requests_new RENAME TO requests",
+        """
+        CREATE TABLE requests_archive_new (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            department_id INTEGER NOT NULL REFERENCES departments (id),
+            request_type_id INTEGER NOT NULL REFERENCES request_types (id),
+            problem TEXT NOT NULL,
+            photo_id TEXT,
+            status_id INTEGER NOT NULL DEFAULT 3 REFERENCES statuses (id),
+            created_at INTEGER NOT NULL,
+            admin_message_id INTEGER,
+            first_response_at INTEGER,
+            resolved_at INTEGER,
+            admin_message_is_caption INTEGER NOT NULL DEFAULT 0,
+            user_message_id INTEGER,
+            digest_id INTEGER,
+            admin_chat_id INTEGER,
+            problem_hash TEXT,
+            archived_at INTEGER NOT NULL
+        )
+        """,
+        """
+        INSERT INTO requests_archive_new
+        SELECT r.id, r.user_id, r.username, r.full_name, d.id, t.id, r.problem, r.photo_id,
+            COALESCE(s.id, 3),
+            CAST(strftime('%s', r.created_at, 'utc') AS INTEGER),
+            r.admin_message_id,
+            CAST(strftime('%s', r.first_response_at, 'utc') AS INTEGER),
+            CAST(strftime('%s', r.resolved_at, 'utc') AS INTEGER),
+            r.admin_message_is_caption, r.user_message_id, r.digest_id, r.admin_chat_id, r.problem_hash,
+            CAST(strftime('%s', r.archived_at, 'utc') AS INTEGER)
+        FROM requests_archive r
+        JOIN departments d ON d.name = r.department
+        JOIN request_types t ON t.name = r.request_type
+        LEFT JOIN statuses s ON s.code = r.status
+        """,
+        "DROP TABLE requests_archive",
+        "ALTER TABLE requests_archive_new RENAME TO requests_archive",
+        "CREATE INDEX idx_requests_user_created ON requests (user_id, created_at)",
+        "CREATE INDEX idx_requests_type_created ON requests (request_type_id, created_at)",
+        "CREATE INDEX idx_requests_status_created ON requests (status_id, created_at)",
+        "CREATE INDEX idx_requests_digest ON requests (digest_id) WHERE digest_id IS NOT NULL",
+        "CREATE INDEX idx_requests_problem_hash ON requests (problem_hash) WHERE problem_hash IS NOT NULL",
+        "CREATE INDEX idx_requests_archive_user_created ON requests_archive (user_id, created_at)",
+        "CREATE INDEX idx_requests_archive_type_created ON requests_archive (request_type_id, created_at)",
+        # Триггеры удалены вместе со старой таблицей
+        """
+        CREATE TRIGGER trg_requests_version_insert AFTER INSERT ON requests
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        """
+        CREATE TRIGGER trg_requests_version_status AFTER UPDATE OF status_id ON requests
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        """
+        CREATE TRIGGER trg_requests_version_delete AFTER DELETE ON requests
+        WHEN NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = old.id)
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        """
+        CREATE TRIGGER trg_requests_fts_insert AFTER INSERT ON requests
+        BEGIN
+            INSERT INTO requests_fts (rowid, problem, full_name, department)
+            VALUES (new.id, new.problem, new.full_name, (SELECT name FROM departments WHERE id = new.department_id));
+        END
+        """,
+        """
+        CREATE TRIGGER trg_requests_fts_update
+        AFTER UPDATE OF problem, full_name, department_id ON requests
+        BEGIN
+            UPDATE requests_fts
+            SET problem = new.problem, full_name = new.full_name,
+                department = (SELECT name FROM departments WHERE id = new.department_id)
+            WHERE rowid = new.id;
+        END
+        """,
+        """
+        CREATE TRIGGER trg_requests_fts_delete AFTER DELETE ON requests
+        WHEN NOT EXISTS (SELECT 1 FROM requests_archive WHERE id = old.id)
+        BEGIN
+            DELETE FROM requests_fts WHERE rowid = old.id;
+        END
+        """,
+        """
+        CREATE VIEW requests_all AS
+        SELECT id, user_id, username, full_name, department_id, request_type_id, problem, photo_id, status_id, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id, problem_hash
+        FROM requests
+        UNION ALL
+        SELECT id, user_id, username, full_name, department_id, request_type_id, problem, photo_id, status_id, created_at, admin_message_id, first_response_at, resolved_at, admin_message_is_caption, user_message_id, digest_id, admin_chat_id, problem_hash
+        FROM requests_archive
+        """,
+        "ANALYZE",
+    ]),
+    # Триггеры на UPDATE срабатывают только при настоящем изменении значений:
+    # повторная установка того же статуса (/bulk, повторное нажатие кнопки)
+    # не увеличивает data_version и не сбрасывает кэш отчетов
+    (14, [
+        "DROP TRIGGER IF EXISTS trg_requests_version_status",
+        """
+        CREATE TRIGGER trg_requests_version_status AFTER UPDATE OF status_id ON requests
+        WHEN old.status_id IS NOT new.status_id
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+        END
+        """,
+        "DROP TRIGGER IF EXISTS trg_requests_fts_update",
+        """
+        CREATE TRIGGER trg_requests_fts_update
+        AFTER UPDATE OF problem, full_name, department_id ON requests
+        WHEN old.problem IS NOT new.problem
+            OR old.full_name IS NOT new.full_name
+            OR old.department_id IS NOT new.department_id
+        BEGIN
+            UPDATE requests_fts
+            SET problem = new.problem, full_name = new.full_name,
+                department = (SELECT name FROM departments WHERE id = new.department_id)
+            WHERE rowid = new.id;
+        END
+        """,
+    ]),
+    # Архив выбирает решенные заявки по времени решения
+    (15, [
+        "CREATE INDEX IF NOT EXISTS idx_requests_status_resolved ON requests (status_id, resolved_at)",
+        "ANALYZE",
+    ]),
+]
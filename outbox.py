@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+from aiogram.client.default import Default
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from pydantic import BaseModel
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Действие после успешной отправки: сохранить message_id в requests.admin_message_id
+ON_SENT_ADMIN_MESSAGE = "admin_message"
+# Сводка заявок (digest.py): ID сообщения получают все заявки сводки,
+# request_id в строке outbox — любая из них
+ON_SENT_DIGEST_MESSAGE = "digest_message"
+
+
+class MessageNotReady(Exception):
+    """Сообщение, которое нужно отредактировать, еще не отправлено."""
+
+
+def utf16_length(text):
+    """Длина текста так, как ее считает Telegram: в единицах UTF-16 (эмодзи — 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate_utf16(text, limit):
+    """Обрезает текст до limit единиц UTF-16, ставя в конце «…»."""
+    if utf16_length(text) <= limit:
+        return text
+    # Половинка суррогатной пары на границе отбрасывается при декодировании
+    return text.encode("utf-16-le")[:(limit - 1) * 2].decode("utf-16-le", errors="ignore") + "…"
+
+
+def _dump(value):
+    if isinstance(value, BaseModel):
+        # Поля со значением Default (parse_mode у InputMedia и т.п.) не сериализуются,
+        # при отправке бот подставит свои значения по умолчанию
+        return {
+            name: _dump(item)
+            for name, item in value
+            if item is not None and not isinstance(item, Default)
+        }
+    if isinstance(value, dict):
+        return {key: _dump(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_dump(item) for item in value]
+    return value
+
+
+class Outbox:
+    """Постоянная очередь исходящих сообщений Telegram.
+
+    Обработчики кладут сообщения в таблицу outbox в той же транзакции,
+    что и изменение данных, а фоновая задача отправляет их с учетом
+    общих и поканальных лимитов Telegram, RetryAfter и повторов с отсрочкой.
+    Правки одного и того же сообщения (coalesce_key) схлопываются в одну.
+
+    У каждого чата своя очередь: за проход из чата берется не больше
+    per_chat_batch сообщений, а RetryAfter останавливает только этот чат,
+    поэтому всплеск в одном чате не задерживает остальные.
+    """
+
+    def __init__(self, bot, pool, global_rate=30, private_chat_rate=1.0, group_chat_rate=20 / 60,
+                 batch_size=100, per_chat_batch=10, poll_interval=5.0, max_attempts=8, backoff_base=1.0,
+                 backoff_max=300.0, concurrency=16):
+        self.bot = bot
+        self.pool = pool
+        self.concurrency = concurrency
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.batch_size = batch_size
+        self.per_chat_batch = per_chat_batch
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._chat_paused_until = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    async def enqueue(self, db, chat_id, method, *, coalesce_key=None, request_id=None, on_sent=None, **kwargs):
+        """Добавляет вызов bot.<method>(chat_id=..., **kwargs) в очередь.
+
+        db — соединение внутри pool.transaction(). Для edit_* без message_id
+        идентификатор берется из requests.admin_message_id заявки request_id
+        в момент отправки.
+        """
+        now = time.time()
+        await db.execute(
+            """INSERT INTO outbox
+            (chat_id, method, payload, coalesce_key, request_id, on_sent, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (coalesce_key) WHERE coalesce_key IS NOT NULL
+            DO UPDATE SET method = excluded.method, payload = excluded.payload, revision = revision + 1""",
+            (chat_id, method, json.dumps(_dump(kwargs), ensure_ascii=False), coalesce_key, request_id, on_sent, now, now)
+        )
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        logger.info("Отправка сообщений из outbox запущена")
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                delay = await self._deliver_due()
+            except Exception as e:
+                logger.error(f"Ошибка при обработке outbox: {e}")
+                delay = self.poll_interval
+            if delay > 0 and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info("Отправка сообщений из outbox остановлена")
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items() if not value.is_full}
+            # Положительные id — личные чаты, отрицательные — группы и каналы
+            rate = self.private_chat_rate if chat_id > 0 else self.group_chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, max(1, round(rate * 3)))
+        return bucket
+
+    def _chat_paused(self, chat_id, now):
+        """Сколько еще секунд чат на паузе после RetryAfter (0 — не на паузе)."""
+        until = self._chat_paused_until.get(chat_id)
+        if until is None:
+            return 0
+        if until <= now:
+            del self._chat_paused_until[chat_id]
+            return 0
+        return until - now
+
+    async def _deliver_due(self):
+        """Отправляет созревшие сообщения, возвращает паузу до следующего прохода."""
+        now = time.time()
+
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
+                """SELECT id, chat_id, method, payload, request_id, on_sent, attempts, revision
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY id) AS position
+                    FROM outbox WHERE next_attempt_at <= ?
+                )
+                WHERE position <= ?
+                ORDER BY id LIMIT ?""",
+                (now, self.per_chat_batch, self.batch_size)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                cursor = await db.execute("SELECT MIN(next_attempt_at) FROM outbox")
+                (next_due,) = await cursor.fetchone()
+                if next_due is None:
+                    return self.poll_interval
+                return min(self.poll_interval, max(0, next_due - now))
+
+        # Разные чаты обслуживаются параллельно (не больше concurrency),
+        # сообщения внутри одного чата уходят строго по порядку
+        by_chat = {}
+        waits = []
+        for row in rows:
+            paused = self._chat_paused(row[1], now)
+            if paused:
+                waits.append(paused)
+            else:
+                by_chat.setdefault(row[1], []).append(row)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sent = []
+
+        async def deliver_chat(chat_id, chat_rows):
+            async with semaphore:
+                for row in chat_rows:
+                    if self._stopping or self._chat_paused(chat_id, time.time()):
+                        return
+                    wait = self._chat_bucket(chat_id).try_acquire()
+                    if wait:
+                        waits.append(wait)
+                        return
+                    await self._global_bucket.acquire()
+                    if not await self._deliver(row):
+                        return
+                    sent.append(row[0])
+
+        await asyncio.gather(*(deliver_chat(chat_id, chat_rows) for chat_id, chat_rows in by_chat.items()))
+        if sent:
+            return 0
+        return min([self.poll_interval] + waits)
+
+    async def _deliver(self, row):
+        outbox_id, chat_id, method, payload, request_id, on_sent, attempts, revision = row
+        kwargs = json.loads(payload)
+        try:
+            if method.startswith("edit_") and "message_id" not in kwargs:
+                kwargs["message_id"] = await self._admin_message_id(request_id)
+            result = await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+        except TelegramRetryAfter as e:
+            # Общий лимит бота держит _global_bucket, так что RetryAfter —
+            # это лимит конкретного чата: притормаживаем только его
+            logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id}, outbox #{outbox_id})")
+            self._chat_paused_until[chat_id] = time.time() + e.retry_after
+            await self._reschedule(outbox_id, e.retry_after, attempts)
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                result = None
+            else:
+                logger.error(f"Telegram отклонил сообщение outbox #{outbox_id} ({method}): {e}")
+                await self._remove(outbox_id, revision)
+                return True
+        except (TelegramNetworkError, TelegramServerError, MessageNotReady, asyncio.TimeoutError) as e:
+            await self._retry(outbox_id, method, attempts, revision, e)
+            return False
+        except TelegramAPIError as e:
+            logger.error(f"Не удалось отправить сообщение outbox #{outbox_id} ({method}): {e}")
+            await self._remove(outbox_id, revision)
+            return True
+        except Exception as e:
+            await self._retry(outbox_id, method, attempts, revision, e)
+            return False
+
+        await self._complete(outbox_id, revision, request_id, on_sent, result)
+        return True
+
+    async def _admin_message_id(self, request_id):
+        async with self.pool.acquire() as db:
+            cursor = await db.execute("SELECT admin_message_id FROM requests WHERE id = ?", (request_id,))
+            row = await cursor.fetchone()
+        if row is None or row[0] is None:
+            raise MessageNotReady(f"сообщение по заявке #{request_id} еще не отправлено")
+        return row[0]
+
+    async def _retry(self, outbox_id, method, attempts, revision, error):
+        attempts += 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Сообщение outbox #{outbox_id} ({method}) не отправлено после {attempts} попыток: {error}")
+            await self._remove(outbox_id, revision)
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempts) * random.uniform(0.8, 1.2)
+        logger.warning(f"Повтор отправки outbox #{outbox_id} ({method}) через {delay:.1f} с: {error}")
+        await self._reschedule(outbox_id, delay, attempts)
+
+    async def _reschedule(self, outbox_id, delay, attempts):
+        async with self.pool.transaction() as db:
+            await db.execute(
+                "UPDATE outbox SET next_attempt_at = ?, attempts = ? WHERE id = ?",
+                (time.time() + delay, attempts, outbox_id)
+            )
+
+    async def _remove(self, outbox_id, revision):
+        # Если за время отправки пришла новая правка (revision изменилась), строка остается
+        async with self.pool.transaction() as db:
+            await db.execute("DELETE FROM outbox WHERE id = ? AND revision = ?", (outbox_id, revision))
+
+    async def _complete(self, outbox_id, revision, request_id, on_sent, result):
+        async with self.pool.transaction() as db:
+            if on_sent == ON_SENT_ADMIN_MESSAGE and result is not None:
+                await db.execute(
+                    "UPDATE requests SET admin_message_id = ? WHERE id = ?",
+                    (result.message_id, request_id)
+                )
+            elif on_sent == ON_SENT_DIGEST_MESSAGE and result is not None:
+                cursor = await db.execute("SELECT digest_id FROM requests WHERE id = ?", (request_id,))
+                row = await cursor.fetchone()
+                if row is not None and row[0] is not None:
+                    await db.execute(
+                        "UPDATE requests SET admin_message_id = ? WHERE digest_id = ?",
+                        (result.message_id, row[0])
+                    )
+                    await db.execute(
+                        "UPDATE digests SET message_id = ? WHERE id = ?",
+                        (result.message_id, row[0])
+                    )
+            await db.execute("DELETE FROM outbox WHERE id = ? AND revision = ?", (outbox_id, revision))
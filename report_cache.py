@@ -0,0 +1,34 @@
+from collections import OrderedDict
+
+
+class ReportCache:
+    """Кэш уже отправленных отчетов: ключ -> file_id документа в Telegram.
+
+    Ключ включает версию данных, поэтому после любого изменения заявок
+    старые записи просто перестают совпадать и вытесняются по LRU,
+    когда число записей превышает max_entries.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        file_id = self._entries.get(key)
+        if file_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return file_id
+
+    def put(self, key, file_id):
+        self._entries[key] = file_id
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,171 @@
+import sqlite3
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+import report_resources
+from lookups import STATUS_CODES
+
+# Построение PDF. Модуль тянет reportlab и импортируется только в процессах
+# пула ReportRenderer, основной процесс бота его не загружает
+
+# Параметры режима больших отчетов
+LARGE_CHUNK_SIZE = 1000
+LARGE_MARGIN = 36
+LARGE_FONT_SIZE = 8
+LARGE_LEADING = 10
+LARGE_CELL_PADDING = 3
+LARGE_MAX_CELL_LINES = 30
+LARGE_COL_WIDTHS = [40, 60, 120, None, 60]
+
+
+# Выполняется в дочернем процессе: на вход только простые данные
+# (список кортежей из БД и строка заголовка), на выходе — байты PDF.
+# Шрифты и стили загружаются один раз при старте процесса-воркера
+def create_pdf(data, title):
+    resources = report_resources.load()
+    style_normal = resources.style_normal
+    style_header = resources.style_header
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+
+    elements = []
+
+    # Заголовок
+    elements.append(Paragraph(title, resources.style_title))
+
+    # Подзаголовок с датой
+    elements.append(Paragraph(
+        f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}",
+        resources.style_subtitle
+    ))
+
+    elements.append(Spacer(1, 12))
+
+    # Подготовка данных таблицы
+    table_data = [
+        [
+            Paragraph("№", style_header),
+            Paragraph("Дата", style_header),
+            Paragraph("Заявитель", style_header),
+            Paragraph("Описание", style_header),
+            Paragraph("Статус", style_header)
+        ]
+    ]
+
+    for row in data:
+        date = datetime.fromtimestamp(row[1]).strftime("%d.%m.%Y")
+        table_data.append([
+            Paragraph(str(row[0]), style_normal),
+            Paragraph(date, style_normal),
+            Paragraph(row[2], style_normal),
+            Paragraph(row[3], style_normal),
+            Paragraph(STATUS_CODES.get(row[4], "?"), style_normal)
+        ])
+
+    # Создаем таблицу с адаптивными размерами
+    table = Table(table_data, colWidths=[30, 60, 120, None, 60])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('WORDWRAP', (0, 0), (-1, -1), True),
+    ]))
+
+    elements.append(table)
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def _wrap_cell(text, font, width):
+    # Перенос по ширине колонки метриками шрифта, без разбора разметки Paragraph
+    lines = simpleSplit(text, font, LARGE_FONT_SIZE, width - 2 * LARGE_CELL_PADDING) or [""]
+    if len(lines) > LARGE_MAX_CELL_LINES:
+        lines = lines[:LARGE_MAX_CELL_LINES]
+        lines[-1] += " …"
+    return "\n".join(lines), len(lines)
+
+
+# Выполняется в дочернем процессе. Строки читаются из БД курсором порциями,
+# каждая страница — отдельная небольшая таблица из обычных строк, страницы
+# сразу уходят в файл path, поэтому память не растет вместе с числом строк
+def create_large_pdf(database, query, params, title, path):
+    resources = report_resources.load()
+    main_font, bold_font = resources.main_font, resources.bold_font
+
+    width, height = A4
+    avail_width = width - 2 * LARGE_MARGIN
+    col_widths = list(LARGE_COL_WIDTHS)
+    col_widths[col_widths.index(None)] = avail_width - sum(w for w in col_widths if w)
+    row_padding = 2 * LARGE_CELL_PADDING
+
+    header = ["№", "Дата", "Заявитель", "Описание", "Статус"]
+    header_height = LARGE_LEADING + row_padding
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), main_font),
+        ('FONTNAME', (0, 0), (-1, 0), bold_font),
+        ('FONTSIZE', (0, 0), (-1, -1), LARGE_FONT_SIZE),
+        ('LEADING', (0, 0), (-1, -1), LARGE_LEADING),
+        ('TOPPADDING', (0, 0), (-1, -1), LARGE_CELL_PADDING),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), LARGE_CELL_PADDING),
+        ('LEFTPADDING', (0, 0), (-1, -1), LARGE_CELL_PADDING),
+        ('RIGHTPADDING', (0, 0), (-1, -1), LARGE_CELL_PADDING),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+
+    pdf = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    pdf.setTitle(title)
+
+    def draw_page(rows, heights, top):
+        table = Table([header] + rows, colWidths=col_widths, rowHeights=[header_height] + heights)
+        table.setStyle(table_style)
+        table.wrapOn(pdf, avail_width, top - LARGE_MARGIN)
+        table.drawOn(pdf, LARGE_MARGIN, top - header_height - sum(heights))
+        pdf.showPage()
+
+    # Шапка первой страницы
+    top = height - LARGE_MARGIN
+    pdf.setFont(bold_font, 16)
+    pdf.drawCentredString(width / 2, top - 16, title)
+    pdf.setFont(main_font, 12)
+    pdf.drawString(LARGE_MARGIN, top - 40, f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
+    top -= 56
+
+    page_rows, page_heights = [], []
+    used = header_height
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        cursor = connection.execute(query, params)
+        while True:
+            chunk = cursor.fetchmany(LARGE_CHUNK_SIZE)
+            if not chunk:
+                break
+            for row in chunk:
+                date = datetime.fromtimestamp(row[1]).strftime("%d.%m.%Y")
+                full_name, name_lines = _wrap_cell(row[2], main_font, col_widths[2])
+                problem, problem_lines = _wrap_cell(row[3], main_font, col_widths[3])
+                row_height = max(name_lines, problem_lines) * LARGE_LEADING + row_padding
+
+                if page_rows and used + row_height > top - LARGE_MARGIN:
+                    draw_page(page_rows, page_heights, top)
+                    top = height - LARGE_MARGIN
+                    page_rows, page_heights = [], []
+                    used = header_height
+
+                page_rows.append([str(row[0]), date, full_name, problem, STATUS_CODES.get(row[4], "?")])
+                page_heights.append(row_height)
+                used += row_height
+    finally:
+        connection.close()
+
+    if page_rows or pdf.getPageNumber() == 1:
+        draw_page(page_rows, page_heights, top)
+    pdf.save()
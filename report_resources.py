@@ -0,0 +1,63 @@
+import logging
+import os
+from collections import namedtuple
+
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.fonts import addMapping
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+logger = logging.getLogger(__name__)
+
+FONTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ReportResources = namedtuple(
+    "ReportResources",
+    ["main_font", "bold_font", "fallback", "style_normal", "style_header", "style_title", "style_subtitle"]
+)
+
+_resources = None
+
+
+def _register_fonts():
+    try:
+        pdfmetrics.registerFont(TTFont('DejaVu', os.path.join(FONTS_DIR, 'DejaVuSans.ttf')))
+        pdfmetrics.registerFont(TTFont('DejaVu-Bold', os.path.join(FONTS_DIR, 'DejaVuSans-Bold.ttf')))
+    except Exception as e:
+        logger.warning(f"Шрифты DejaVu недоступны, в отчетах используется Helvetica: {e}")
+        return 'Helvetica', 'Helvetica-Bold', True
+
+    # Чтобы <b> внутри Paragraph переключал на жирное начертание DejaVu
+    addMapping('DejaVu', 0, 0, 'DejaVu')
+    addMapping('DejaVu', 1, 0, 'DejaVu-Bold')
+    addMapping('DejaVu', 0, 1, 'DejaVu')
+    addMapping('DejaVu', 1, 1, 'DejaVu-Bold')
+    return 'DejaVu', 'DejaVu-Bold', False
+
+
+def load():
+    """Регистрирует шрифты и собирает стили один раз на процесс.
+
+    Возвращаемые стили общие для всех отчетов, изменять их нельзя.
+    """
+    global _resources
+    if _resources is not None:
+        return _resources
+
+    main_font, bold_font, fallback = _register_fonts()
+    style_normal = ParagraphStyle(
+        "ReportBody", fontName=main_font, fontSize=8, leading=10, alignment=TA_JUSTIFY
+    )
+    _resources = ReportResources(
+        main_font=main_font,
+        bold_font=bold_font,
+        fallback=fallback,
+        style_normal=style_normal,
+        style_header=ParagraphStyle("ReportHeader", parent=style_normal, fontName=bold_font),
+        style_title=ParagraphStyle(
+            "ReportTitle", fontName=bold_font, fontSize=16, leading=18, spaceAfter=12, alignment=TA_CENTER
+        ),
+        style_subtitle=ParagraphStyle("ReportSubtitle", fontName=main_font, fontSize=12, leading=14),
+    )
+    return _resources
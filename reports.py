@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ReportRendererBusy(Exception):
+    """Очередь на формирование отчетов заполнена."""
+
+
+# Функции ниже выполняются в процессах пула. В пул передается только имя
+# функции report_pdf, поэтому reportlab импортируется в воркерах, а не в боте
+def _init_worker():
+    # Импорт reportlab, шрифты и стили — один раз при запуске воркера
+    import report_pdf  # noqa: F401
+    import report_resources
+
+    report_resources.load()
+
+
+def _call(name, *args):
+    import report_pdf
+
+    return getattr(report_pdf, name)(*args)
+
+
+def _ready():
+    return True
+
+
+class ReportRenderer:
+    """Формирование PDF в пуле процессов, чтобы не блокировать event loop.
+
+    Одновременно выполняется не больше max_workers отчетов, еще max_queue
+    ждут своей очереди; сверх этого render() сразу бросает ReportRendererBusy.
+    """
+
+    def __init__(self, max_workers=2, max_queue=4):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def start(self):
+        # spawn: дочерние процессы не наследуют потоки aiosqlite и состояние event loop.
+        # Каждый воркер заново импортирует main.py как __mp_main__, поэтому бот,
+        # пул БД и поток логирования создаются не при импорте, а в main.setup()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def warm_up(self, delay=0):
+        """Заранее запускает воркеры, чтобы первый отчет не ждал их старта.
+
+        Процессы пула создаются по требованию, поэтому в пул отправляется
+        max_workers пустых задач. Вызывается фоновой задачей после запуска бота.
+        """
+        await asyncio.sleep(delay)
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _ready) for _ in range(self.max_workers)
+            ))
+        except Exception as e:
+            logger.warning(f"Не удалось заранее запустить воркеры отчетов: {e}")
+            return
+        logger.info(f"Воркеры отчетов запущены за {loop.time() - started:.1f} с")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, func, *args):
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ReportRendererBusy()
+
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def render(self, data, title):
+        """Обычный отчет: возвращает байты PDF."""
+        return await self._submit(_call, "create_pdf", data, title)
+
+    async def render_large(self, database, query, params, title, path):
+        """Большой отчет: воркер сам читает строки из БД и пишет PDF в файл path."""
+        return await self._submit(_call, "create_large_pdf", database, query, params, title, path)
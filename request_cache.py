@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+
+class RequestCache:
+    """Кэш заявок для кнопок смены статуса и страниц /my_requests.
+
+    Записи: request_id -> неизменяемые поля заявки, которые читает update_status
+    (статус в кэше не хранится: его меняют и другие процессы бота).
+    Страницы: (user_id, фильтры и курсор) -> результат load_requests_page.
+    Оба словаря ограничены числом записей и вытесняются по LRU. Устаревание
+    по времени не используется: код, который меняет заявку, сам сбрасывает
+    ее запись (invalidate_record) и страницы ее автора (invalidate_user)
+    после COMMIT.
+
+    Страницы читаются через пул читателей параллельно с записью, поэтому
+    страница кладется в кэш, только если с момента page_token() не было
+    ни одного сброса: иначе она могла быть прочитана до изменения.
+    """
+
+    def __init__(self, max_records=1000, max_pages=1000):
+        self.max_records = max_records
+        self.max_pages = max_pages
+        self.record_hits = 0
+        self.record_misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+        self._records = OrderedDict()
+        self._pages = OrderedDict()
+        self._user_pages = {}
+        self._invalidations = 0
+
+    def get_record(self, request_id):
+        record = self._records.get(request_id)
+        if record is None:
+            self.record_misses += 1
+            return None
+        self._records.move_to_end(request_id)
+        self.record_hits += 1
+        return record
+
+    def put_record(self, request_id, record):
+        self._records[request_id] = record
+        self._records.move_to_end(request_id)
+        while len(self._records) > self.max_records:
+            self._records.popitem(last=False)
+
+    def invalidate_record(self, request_id):
+        self._records.pop(request_id, None)
+
+    def page_token(self):
+        return self._invalidations
+
+    def get_page(self, user_id, key):
+        page = self._pages.get((user_id, key))
+        if page is None:
+            self.page_misses += 1
+            return None
+        self._pages.move_to_end((user_id, key))
+        self.page_hits += 1
+        return page
+
+    def put_page(self, user_id, key, page, token):
+        if token != self._invalidations:
+            return
+        self._pages[(user_id, key)] = page
+        self._pages.move_to_end((user_id, key))
+        self._user_pages.setdefault(user_id, set()).add(key)
+        while len(self._pages) > self.max_pages:
+            (old_user_id, old_key), _ = self._pages.popitem(last=False)
+            keys = self._user_pages[old_user_id]
+            keys.discard(old_key)
+            if not keys:
+                del self._user_pages[old_user_id]
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает все страницы /my_requests пользователя."""
+        self._invalidations += 1
+        for key in self._user_pages.pop(user_id, ()):
+            del self._pages[(user_id, key)]
+
+    def __len__(self):
+        return len(self._records) + len(self._pages)
@@ -0,0 +1,125 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Маршрут для любого отдела / любого типа заявки
+ANY = "*"
+
+
+class RoutingTable:
+    """Маршруты заявок по чатам администраторов (таблицы admin_routes и chat_admins).
+
+    Таблицы целиком держатся в памяти и перечитываются после каждого
+    изменения, поэтому выбор чата и проверка прав не обращаются к БД.
+    Заявка уходит по самому точному маршруту: отдел и тип, только отдел,
+    только тип, '*'; если маршрута нет — в default_chat_id.
+    superadmin_id (ADMIN_ID) может все и управляет маршрутами.
+    """
+
+    def __init__(self, pool, default_chat_id, superadmin_id):
+        self.pool = pool
+        self.default_chat_id = default_chat_id
+        self.superadmin_id = superadmin_id
+        self._routes = {}
+        self._route_ids = {}
+        self._admins = {}
+
+    async def load(self):
+        async with self.pool.acquire() as db:
+            cursor = await db.execute("SELECT id, department, request_type, chat_id FROM admin_routes")
+            routes = await cursor.fetchall()
+            cursor = await db.execute("SELECT chat_id, user_id FROM chat_admins")
+            admins = await cursor.fetchall()
+
+        self._routes = {(department, request_type): chat_id for _, department, request_type, chat_id in routes}
+        self._route_ids = {route_id: (department, request_type) for route_id, department, request_type, _ in routes}
+        grouped = {}
+        for chat_id, user_id in admins:
+            grouped.setdefault(chat_id, set()).add(user_id)
+        self._admins = {chat_id: frozenset(users) for chat_id, users in grouped.items()}
+        logger.info(f"Маршрутов заявок: {len(routes)}, администраторов чатов: {len(admins)}")
+
+    def chat_for(self, department, request_type):
+        for key in ((department, request_type), (department, ANY), (ANY, request_type), (ANY, ANY)):
+            chat_id = self._routes.get(key)
+            if chat_id is not None:
+                return chat_id
+        return self.default_chat_id
+
+    def is_superadmin(self, user_id):
+        return user_id == self.superadmin_id
+
+    def is_admin(self, user_id):
+        """Главный администратор или администратор хотя бы одного чата."""
+        return self.is_superadmin(user_id) or any(user_id in admins for admins in self._admins.values())
+
+    def can_manage(self, user_id, chat_id, from_chat_id=None):
+        """Может ли пользователь менять статус заявок, отправленных в чат chat_id."""
+        if self.is_superadmin(user_id):
+            return True
+        admins = self._admins.get(chat_id)
+        if admins:
+            return user_id in admins
+        # Администраторы чата не заданы — кнопками пользуются все участники чата
+        return from_chat_id is not None and from_chat_id == chat_id
+
+    def report_scope(self, user_id, request_type):
+        """Отделы, по которым пользователь получает отчет по типу request_type.
+
+        None — все отделы, пустое множество — отчет недоступен.
+        """
+        if self.is_superadmin(user_id):
+            return None
+        chats = {chat_id for chat_id, admins in self._admins.items() if user_id in admins}
+        departments = set()
+        for (department, route_type), chat_id in self._routes.items():
+            if chat_id not in chats or route_type not in (ANY, request_type):
+                continue
+            if department == ANY:
+                return None
+            departments.add(department)
+        return frozenset(departments)
+
+    def routes(self):
+        """[(id, отдел, тип, chat_id)] в порядке добавления."""
+        return [
+            (route_id, department, request_type, self._routes[(department, request_type)])
+            for route_id, (department, request_type) in sorted(self._route_ids.items())
+        ]
+
+    def admins(self, chat_id):
+        return sorted(self._admins.get(chat_id, ()))
+
+    async def set_route(self, department, request_type, chat_id):
+        async with self.pool.transaction() as db:
+            await db.execute(
+                """INSERT INTO admin_routes (department, request_type, chat_id) VALUES (?, ?, ?)
+                ON CONFLICT (department, request_type) DO UPDATE SET chat_id = excluded.chat_id""",
+                (department, request_type, chat_id)
+            )
+        await self.load()
+
+    async def delete_route(self, route_id):
+        async with self.pool.transaction() as db:
+            cursor = await db.execute("DELETE FROM admin_routes WHERE id = ?", (route_id,))
+            deleted = cursor.rowcount
+        await self.load()
+        return deleted > 0
+
+    async def add_admin(self, chat_id, user_id):
+        async with self.pool.transaction() as db:
+            await db.execute(
+                "INSERT OR IGNORE INTO chat_admins (chat_id, user_id) VALUES (?, ?)",
+                (chat_id, user_id)
+            )
+        await self.load()
+
+    async def remove_admin(self, chat_id, user_id):
+        async with self.pool.transaction() as db:
+            cursor = await db.execute(
+                "DELETE FROM chat_admins WHERE chat_id = ? AND user_id = ?",
+                (chat_id, user_id)
+            )
+            deleted = cursor.rowcount
+        await self.load()
+        return deleted > 0
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+# Дневные агрегаты по отделам и типам заявок (таблица daily_rollups).
+# Все функции вызываются внутри pool.transaction() вместе с изменением
+# самой заявки, поэтому агрегаты не расходятся с requests.
+# Даты в requests — секунды Unix, в status_events и агрегатах — строки
+# в локальном времени.
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+ROLLUP_UPSERT = """INSERT INTO daily_rollups (
+        day, department, request_type, opened, closed, reopened,
+        first_response_count, first_response_seconds, resolution_count, resolution_seconds
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, department, request_type) DO UPDATE SET
+        opened = opened + excluded.opened,
+        closed = closed + excluded.closed,
+        reopened = reopened + excluded.reopened,
+        first_response_count = first_response_count + excluded.first_response_count,
+        first_response_seconds = first_response_seconds + excluded.first_response_seconds,
+        resolution_count = resolution_count + excluded.resolution_count,
+        resolution_seconds = resolution_seconds + excluded.resolution_seconds"""
+
+
+async def _add_rollup(db, day, department, request_type, opened=0, closed=0, reopened=0,
+                      first_response=None, resolution=None):
+    await db.execute(ROLLUP_UPSERT, (
+        day, department, request_type, opened, closed, reopened,
+        int(first_response is not None), first_response or 0.0,
+        int(resolution is not None), resolution or 0.0
+    ))
+
+
+async def record_request_created(db, request_id, department, request_type, created_at):
+    """department и request_type — названия, created_at — секунды Unix."""
+    created = datetime.fromtimestamp(created_at).strftime(DATE_FORMAT)
+    await db.execute(
+        """INSERT INTO status_events (request_id, old_status, new_status, changed_by, created_at)
+        VALUES (?, NULL, 'new', NULL, ?)""",
+        (request_id, created)
+    )
+    await _add_rollup(db, created[:10], department, request_type, opened=1)
+
+
+async def record_status_change(db, request_id, old_status, new_status, changed_by,
+                               department, request_type, created_at, first_response_at):
+    """Пишет событие и обновляет агрегаты. Вызывается вместе с UPDATE requests.
+
+    Статусы — коды, department и request_type — названия, created_at и
+    first_response_at — секунды Unix из уже прочитанной строки заявки.
+    Повторная установка того же статуса событием не считается.
+    """
+    if old_status == new_status:
+        return
+
+    changed_at = datetime.now()
+    timestamp = int(changed_at.timestamp())
+    now = changed_at.strftime(DATE_FORMAT)
+    await db.execute(
+        """INSERT INTO status_events (request_id, old_status, new_status, changed_by, created_at)
+        VALUES (?, ?, ?, ?, ?)""",
+        (request_id, old_status, new_status, changed_by, now)
+    )
+
+    # Первая реакция — первый уход из статуса "new"
+    first_response = None
+    if first_response_at is None:
+        first_response = float(max(0, timestamp - created_at))
+        await db.execute("UPDATE requests SET first_response_at = ? WHERE id = ?", (timestamp, request_id))
+
+    closed = reopened = 0
+    resolution = None
+    if new_status == "done":
+        closed = 1
+        resolution = float(max(0, timestamp - created_at))
+        await db.execute("UPDATE requests SET resolved_at = ? WHERE id = ?", (timestamp, request_id))
+    elif old_status == "done":
+        reopened = 1
+
+    await _add_rollup(
+        db, now[:10], department, request_type,
+        closed=closed, reopened=reopened, first_response=first_response, resolution=resolution
+    )
+
+
+async def load_sla(db, start_day, end_day):
+    """Сводка по отделам за дни [start_day, end_day] и текущий backlog. Читает только daily_rollups."""
+    cursor = await db.execute(
+        """SELECT department,
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN opened ELSE 0 END),
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN closed ELSE 0 END),
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN first_response_count ELSE 0 END),
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN first_response_seconds ELSE 0 END),
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN resolution_count ELSE 0 END),
+            SUM(CASE WHEN day BETWEEN ? AND ? THEN resolution_seconds ELSE 0 END),
+            SUM(opened) - SUM(closed) + SUM(reopened)
+        FROM daily_rollups
+        GROUP BY department
+        ORDER BY department""",
+        (start_day, end_day) * 6
+    )
+    return await cursor.fetchall()
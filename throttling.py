@@ -0,0 +1,55 @@
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from ratelimit import TokenBucket
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты сообщений и нажатий кнопок от одного пользователя.
+
+    Подключается как outer middleware, поэтому лишние обновления
+    отбрасываются до фильтров и чтения состояния FSM, не доходя до БД.
+    У каждого пользователя свой TokenBucket: rate событий в секунду,
+    не больше capacity подряд. О превышении пользователь узнает один раз
+    за серию, чтобы не отвечать на каждое лишнее сообщение.
+    exempt(user_id) — кого не ограничивать (администраторов).
+    """
+
+    def __init__(self, rate, capacity, exempt=None, metrics=None, max_users=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.exempt = exempt
+        self.metrics = metrics
+        self.max_users = max_users
+        self._buckets = {}
+        self._warned = set()
+
+    def _bucket(self, user_id):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                # Полные корзины ничего не помнят — их можно выбросить
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.is_full}
+                self._warned &= self._buckets.keys()
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.capacity)
+        return bucket
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None or (self.exempt is not None and self.exempt(user.id)):
+            return await handler(event, data)
+
+        wait = self._bucket(user.id).try_acquire()
+        if not wait:
+            self._warned.discard(user.id)
+            return await handler(event, data)
+
+        if self.metrics is not None:
+            self.metrics.inc("bot_throttled_total", (("event", type(event).__name__),))
+        text = f"⏳ Слишком много запросов, подождите {max(1, round(wait))} с"
+        if isinstance(event, CallbackQuery):
+            await event.answer(text)
+        elif user.id not in self._warned:
+            self._warned.add(user.id)
+            await event.answer(text)
+        return None
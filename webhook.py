@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from metrics import add_metrics_route
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Прием обновлений от Telegram с ограничением параллельной обработки.
+
+    Запрос подтверждается сразу, обработка идет в фоне: одновременно не больше
+    concurrency обновлений, а если в очереди уже max_pending, отвечаем 503 —
+    Telegram повторит доставку позже. При остановке новые обновления
+    не принимаются, а уже принятые дорабатываются (drain).
+    """
+
+    def __init__(self, dispatcher, bot, concurrency=32, max_pending=1000, drain_timeout=30, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @property
+    def in_flight(self):
+        return len(self._background_feed_update_tasks)
+
+    async def _background_feed_update(self, bot, update):
+        async with self._semaphore:
+            try:
+                await super()._background_feed_update(bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке обновления: {e}")
+
+    async def handle(self, request):
+        if not self.accepting or self.in_flight >= self.max_pending:
+            return web.Response(status=503, text="Busy")
+        return await super().handle(request)
+
+    async def drain(self, *args, **kwargs):
+        self.accepting = False
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Дожидаемся обработки {len(tasks)} обновлений")
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning(f"Не дождались обработки {len(pending)} обновлений")
+
+
+def build_app(dispatcher, bot, path, secret_token=None, concurrency=32, max_pending=1000, metrics=None, **data):
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dispatcher, bot,
+        concurrency=concurrency,
+        max_pending=max_pending,
+        secret_token=secret_token,
+        **data
+    )
+
+    async def health(request):
+        status = 200 if handler.accepting else 503
+        return web.json_response({"accepting": handler.accepting, "in_flight": handler.in_flight}, status=status)
+
+    # Порядок важен: сначала дорабатываем принятые обновления,
+    # потом shutdown диспетчера и закрытие сессии бота
+    app.on_shutdown.append(handler.drain)
+    setup_application(app, dispatcher, bot=bot, **data)
+    handler.register(app, path=path)
+    app.router.add_get("/healthz", health)
+    if metrics is not None:
+        add_metrics_route(app, metrics)
+    app["webhook_handler"] = handler
+    return app
+
+
+async def run_webhook(dispatcher, bot, url, path, host="0.0.0.0", port=8080, secret_token=None,
+                      concurrency=32, max_pending=1000, metrics=None):
+    # Без секрета любой, кто знает адрес, может присылать боту поддельные
+    # обновления от имени администратора
+    if not secret_token:
+        raise RuntimeError("Для режима webhook нужно задать WEBHOOK_SECRET")
+    app = build_app(
+        dispatcher, bot, path,
+        secret_token=secret_token, concurrency=concurrency, max_pending=max_pending, metrics=metrics
+    )
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    handled_signals = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: обработчиков сигналов в event loop нет, Ctrl+C приходит
+            # как KeyboardInterrupt — asyncio.run отменяет задачу, и остановка
+            # идет через finally ниже
+            continue
+        handled_signals.append(sig)
+
+    try:
+        await bot.set_webhook(
+            url=url,
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+        logger.info(f"Webhook запущен на {host}:{port}{path}")
+        await stop.wait()
+    finally:
+        for sig in handled_signals:
+            loop.remove_signal_handler(sig)
+        # cleanup останавливает прием соединений и вызывает on_shutdown
+        await runner.cleanup()
+        logger.info("Webhook остановлен")